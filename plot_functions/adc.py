@@ -7,24 +7,30 @@
 
 import re
 import sys
-import numpy as np
-import pandas as pd
 from src import text
+from src import tools
 from plot_functions import replot
 
+KWARGS = ['bits', 'dnl', 'inl', 'var', 'data', 'tail']
+
 
 def usage():
     print(f'{sys.argv[0]} [options] sar_adc INPUT [kwargs]')
     print('''
     bits=int        Set number of bits (opt; performs sanity checks)
     dnl=bool        Enable DNL, requires var == code voltage (default: True)
-    inl=bool        Enable INL, requires var == code voltage (default: False)
+    inl=bool        Enable INL and endpoint/best-fit INL in LSB (inl_end, inl_fit),
+                    requires var == code voltage (default: False)
     var=str         Variable to plot against (default: Column 0)
     data=str        Label to check for bits (default: 'D')
     tail=int        Display this number of the worst DNL (default: 0)''')
 
 
 def plot(df, kwargs):
+    import numpy as np
+    import pandas as pd
+    from src import decode
+
     param = {
         'var': df.columns[0],
         'data': 'D',
@@ -46,35 +52,20 @@ def plot(df, kwargs):
 
     df_out = pd.DataFrame(df[param['var']].copy())
     df_out = df_out.replace('0b', '', regex=False)
-    df_out['code'] = np.zeros(len(df_out))
+    if df_out[param['var']].dtype == object:
+        df_out[param['var']] = tools.si_parse(df_out[param['var']])
 
-    for index, col in enumerate(df.columns[1:]):
-        if param['data'] in col:
-            i = re.match(r'.*([0-9]+).*', col)[1]
-            df_out['code'] = df_out['code'] + (df[col] * (2 ** int(i)))
+    # One dot product of the bit columns against their weights
+    columns = [col for col in df.columns[1:] if param['data'] in col]
+    bit_weights = np.array([2 ** int(re.match(r'.*([0-9]+).*', col)[1]) for col in columns])
+    df_out['code'] = decode.codes(df[columns].to_numpy(dtype=float), bit_weights.astype(float))
 
     if param['bits']:
-        if (index + 1) != param['bits']:
-            text.error(f'Decoded bitwidth ({index}) does not match specified bitwidth ({param["bits"]})', 123)
-
-    if param['dnl']:
-        df_out['dnl'] = np.append(
-            np.array(df_out["code"][1:]) - np.array(df_out["code"][0:-1]),
-            np.nan)
-        df_out['abs_dnl'] = np.abs(df_out['dnl'])
-        if param['tail']:
-            print(
-                df_out.sort_values("abs_dnl",
-                                   ascending=False)[[param["var"],
-                                                     "dnl"]][0:param['tail']])
+        if len(columns) != param['bits']:
+            text.error(f'Decoded bitwidth ({len(columns)}) does not match specified bitwidth ({param["bits"]})', 123)
 
-    if param['inl'] and param['bits']:
-        vmax = np.max(df[param['var']])
-        vmin = np.min(df[param['var']])
-        codespace = np.linspace(vmin, vmax, num=2**param['bits'])
-        df_out['inl'] = [codespace[int(i)] for i in df_out["code"]]
-    elif param['inl']:
-        text.error('Bitwidth not specified; cannot compute INL')
+    df_out = decode.linearity(df_out, param['var'], param['bits'],
+                              param['dnl'], param['inl'], param['tail'])
 
     # Call replot
-    replot.plot(df_out, kwargs)
+    return replot.plot(df_out, kwargs)
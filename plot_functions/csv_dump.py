@@ -6,6 +6,10 @@ import re
 import os
 from src import tools
 
+# Accepts an iterator of DataFrame chunks (see --stream)
+STREAM = True
+KWARGS = ['x', 'filename']
+
 
 def usage():
     print(f'''{sys.argv[0]} [options] csv_dump INPUT [kwargs]
@@ -27,6 +31,9 @@ def plot(df, kwargs):
 
         param[key] = value
 
+    chunks = [df] if hasattr(df, 'columns') else df
+    df, chunks = tools.peek(iter(chunks))
+
     if param['x']:
         df.rename(columns={'x': param['x']}, inplace=True)
 
@@ -34,11 +41,17 @@ def plot(df, kwargs):
     if param['filename']:
         filename = param['filename'].strip('.csv') + '.' + param['filetype']
         allow = tools.query(f'Overwrite {filename}?', 'yes') if os.path.isfile(filename) else True
-        if allow:
-            df.to_csv(path_or_buf=filename, index=False)
+        if not allow:
+            return None
     else:
         y = re.sub('/', '-', '+'.join(df.columns[1:])) if not param['x'] else re.sub('/', '-', '+'.join(df.columns))
         filename = f'./plots/{y}_{param["time"]}.{param["filetype"]}'
-        df.to_csv(path_or_buf=filename, index=False)
+
+    for index, chunk in enumerate(chunks):
+        if param['x']:
+            chunk = chunk.rename(columns={'x': param['x']})
+        chunk.to_csv(path_or_buf=filename, index=False,
+                     mode='w' if index == 0 else 'a', header=index == 0)
 
     print(f'Output:  {os.path.realpath(filename)}')
+    return filename
@@ -4,6 +4,8 @@
 from plot_functions import replot
 import sys
 
+KWARGS = ['gmid', 'vgs', 'id', 'idwl', 'vov', 'ft']
+
 
 def usage():
     print(f'''{sys.argv[0]} -s gmid INPUT [kwargs]
@@ -38,7 +40,7 @@ def plot(df, kwargs):
         f'y={param["gmid"]}', 'pt=scatter', 'xlabel=Vov [V]',
         'ylabel=Gm/Id [1/V]'
     ]
-    replot.plot(df, kwargs_gmid)
+    filenames = [replot.plot(df, kwargs_gmid)]
 
     # Plot Id/(W/L) vs gm/Id
     df['x'] = df[param['gmid']]
@@ -46,11 +48,13 @@ def plot(df, kwargs):
         f'y={param["idwl"]}', 'pt=scatter', 'xlabel=Gm/Id [1/V]',
         'ylabel=Id/(W/L) [A]'
     ]
-    replot.plot(df, kwargs_idwl)
+    filenames.append(replot.plot(df, kwargs_idwl))
 
     # Plot ft vs gm/Id
     kwargs_ft = kwargs + [
         f'y={param["ft"]}', 'pt=scatter', 'xlabel=Gm/Id [1/V]',
         'ylabel=ft [Hz]'
     ]
-    replot.plot(df, kwargs_ft)
+    filenames.append(replot.plot(df, kwargs_ft))
+
+    return filenames
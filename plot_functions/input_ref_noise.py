@@ -1,16 +1,16 @@
 # Zephan M. Enciso
 # Intelligent MicroSystems Lab
 
-# This function is painfully slow because the sampling logic is terrible
-# TODO: Sample better
+# Each sweep value's comparator output is sampled every Ts after delay on the
+# time axis the sweeps share, and averaged into the fraction of high decisions.
 
 from plot_functions import replot
-from scipy.optimize import curve_fit
 from src import text
-import pandas as pd
-import numpy as np
 import sys
 
+COLUMNS = ['x']
+KWARGS = ['fs', 'Ts', 'delay', 'y', 'var', 'hue', 'ci', 'jobs']
+
 
 def usage():
     print(f'''{sys.argv[0]} inputrefnoise INPUT [kwargs]
@@ -19,83 +19,110 @@ def usage():
     delay=float     Set delay before first sample (default: 0)
     y=str           Comparator signal (default: Column 1)
     var=str         Variable to compare against (default: Column 2)
+    hue=str         Fit each value of hue (e.g. a corner or MC seed) separately
+    ci=float        Confidence level of the sigma interval in % (default: 95)
+    jobs=int        Fit in this many worker processes (default: 1)
     Uses the same plotting kwargs as replot''')
 
 
-def gauss(x, H, A, x0, sigma):
-    return H + A * np.exp(-((x - x0) ** 2) / (2 * sigma**2))
+def align_num(num):
+    return f'{num: .9g}'
 
 
-def align_num(num):
-    string = str(num)
+def sample(df, param):
+    ''' Mean comparator output of each sweep value, sampled every Ts after delay '''
+    import numpy as np
+    import pandas as pd
 
-    if '-' in string:
-        return string[:12] if len(string) >= 12 else string
-    else:
-        return ' ' + string[:11] if len(string) >= 11 else ' ' + string
+    # Each sweep value is one run of the shared time axis
+    size = np.unique(df['x']).size
+    sweeps = len(df) // size
+    if len(df) % size:
+        text.cprint('WARNING', f'Ignoring the last {len(df) % size} rows (not a whole sweep)')
+
+    time = df['x'].to_numpy(dtype=float)[:size]
+    wave = df[param['y']].to_numpy(dtype=float)[:sweeps * size].reshape(sweeps, size)
+    swept = df[param['var']].to_numpy()[size - 1:sweeps * size:size]
+
+    # Sample instants accumulate Ts one step at a time, as a running clock would
+    count = max(int((time[-1] - param['delay']) / param['Ts']) + 1, 1)
+    instants = np.cumsum(np.r_[param['Ts'] + param['delay'], np.full(count, param['Ts'])])
+    index = np.searchsorted(time, instants[instants <= time[-1]], side='left')
+
+    return pd.DataFrame({'x': swept.astype(float), param['y']: wave[:, index].mean(axis=1)})
+
+
+def transition(sampled, y):
+    ''' Change in sampled y between sweep values, placed between them '''
+    dy = sampled[y][1:].values - sampled[y][0:-1].values
+    x = sampled['x'][0:-1].values
+
+    # Too few sweep values to have a step; the fit then reports the group as too short
+    step = x[-1] - x[-2] if len(x) > 1 else 0
+    return x + step * 0.5, dy
 
 
 def plot(df, kwargs):
+    import pandas as pd
+    from src import fit
+
     param = {
         'fs': 50e6,
         'Ts': None,
         'y': df.columns[1],
         'var': df.columns[2],
-        'delay': 9e-9
+        'delay': 9e-9,
+        'hue': None,
+        'ci': 95,
+        'jobs': 1
     }
 
     for arg in kwargs:
         key, value = arg.split('=')
+        if key == 'h':
+            key = 'hue'
         if key in param:
             param[key] = value
 
     param['fs'] = float(param['fs'])
     param['delay'] = float(param['delay'])
+    param['ci'] = float(param['ci'])
+    param['jobs'] = int(param['jobs'])
 
     if not param['Ts']:
         param['Ts'] = 1 / param['fs']
     else:
         param['Ts'] = float(param['Ts'])
 
-    d_fill = pd.Series(np.empty(shape=(0), dtype=np.float64))
-
-    for i in range(0, len(df), size := np.unique(df['x']).size):
-        time = param['Ts'] + param['delay']
-        samples = list()
-        for index, series in df.iloc[i:i + size].iterrows():
-            hue = series[param['var']]
-            if series['x'] >= time:
-                samples.append(series[param['y']])
-                time += param['Ts']
-
-        d_fill = pd.concat([d_fill, pd.Series([hue, np.mean(samples)])],
-                           axis=1,
-                           ignore_index=True)
-
-    pd_sampled = pd.DataFrame(d_fill.T.values,
-                              columns=['x', param['y']]).iloc[1:, :]
-
-    y = pd_sampled[param['y']][1:].values - pd_sampled[param['y']][0:-1].values
-    x = pd_sampled['x'][0:-1].values
-    x = x + (x[-1] - x[-2]) * 0.5
-
-    try:
-        parameters, covariance = curve_fit(
-            gauss,
-            x,
-            y,
-            maxfev=100000,
-            bounds=np.array([[-np.inf, 0, -np.inf, 0],
-                             [np.inf, np.inf, np.inf, np.inf]]))
-
+    # Sample (and later fit) each hue value on its own
+    if param['hue']:
+        groups = df.groupby(param['hue'], sort=False, observed=True)
+        pd_sampled = pd.concat([sample(group, param).assign(**{param['hue']: key})
+                                for key, group in groups], ignore_index=True)
+        groups = pd_sampled.groupby(param['hue'], sort=False, observed=True)
+    else:
+        pd_sampled = sample(df, param)
+        groups = [(None, pd_sampled)]
+
+    fits, errors = fit.fit_many([(key, *transition(group, param['y'])) for key, group in groups],
+                                param['ci'], param['jobs'])
+
+    for key, error in errors:
+        text.error('Unable to fit Gaussian curve'
+                   + (f' for {param["hue"]} = {key}' if param['hue'] else '') + f': {error}')
+
+    if param['hue']:
+        table = pd.DataFrame([{param['hue']: key} | row for key, row in fits])
+        print('Gaussian fit parameters:')
+        print(table[[param['hue'], 'sigma', 'sigma_lo', 'sigma_hi', 'mu', 'A', 'H']]
+              .to_string(index=False))
+    elif not errors:
+        row = fits[0][1]
         print(f'''Gaussian fit parameters:
-sigma {align_num(parameters[3])}
-   mu {align_num(parameters[2])}
-    A {align_num(parameters[1])}
-    H {align_num(parameters[0])}''')
-
-    except Exception as e:
-        text.error(f'Unable to fit Gaussian curve: {e}')
+sigma {align_num(row['sigma'])} ({param['ci']:g}% CI {align_num(row['sigma_lo']).strip()} to {align_num(row['sigma_hi']).strip()})
+   mu {align_num(row['mu'])}
+    A {align_num(row['A'])}
+    H {align_num(row['H'])}''')
 
     kwargs = ['pt=scatter'] + kwargs + [f'y={param["y"]}']
-    replot.plot(pd_sampled, kwargs)
+    return replot.plot(pd_sampled, kwargs)
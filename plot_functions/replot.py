@@ -4,14 +4,30 @@
 from src import tools
 from src import text
 
-from matplotlib.colors import LogNorm
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import re
 import sys
 import os
 import warnings
+import threading
+
+# Accepts an iterator of DataFrame chunks (see --stream)
+STREAM = True
+KWARGS = ['x', 'y', 'hue', 'style', 'size', 'xscale', 'yscale', 'hscale',
+          'sscale', 'figsize', 'xlabel', 'ylabel', 'ltitle', 'axes', 'context',
+          'logx', 'logy', 'logv', 'bbox', 'xlim', 'ylim', 'vlim', 'width',
+          'alpha', 'palette', 'ptype', 'ci', 'stat', 'bins', 'xbins', 'ybins',
+          'fill', 'multiple', 'decimate', 'fast', 'raster', 'dpi', 'filetype',
+          'filename', 'maxrows']
+
+# Rows above which hist/kde are binned with NumPy before plotting (fast=auto)
+FAST_ROWS = 100000
+
+# Rows kept from a streamed INPUT, thinned evenly beyond this (maxrows)
+MAX_ROWS = 5000000
+
+# Seaborn styles and Matplotlib artists read the global rcParams, so drawing
+# and saving hold this lock; data preparation runs outside it
+LOCK = threading.RLock()
 
 
 def usage():
@@ -27,6 +43,7 @@ Data
     yscale=float    ys=float    Rescale y axis (default: 1)
     hscale=float    hs=float    Rescale hue (default: 1)
     sscale=float    ss=float    Rescale style (default: 1)
+    maxrows=int                 Thin streamed INPUT evenly to int rows (default: 5000000)
 Figure
     figsize=tuple   fs=tuple    Change figsize (default: '6,3')
     xlabel=str      xl=str      Change x axis label (default: x)
@@ -49,30 +66,157 @@ Drawing
     ci=float                    Change confidence interval size (default: 95)
     stat=str                    Change stat/estimator (default: Depends)
     bins=int                    Change number of bins/levels (default: 10)
+    xbins=int|list              Bin heatmap x into int bins or at list edges (default: None)
+    ybins=int|list              Bin heatmap y into int bins or at list edges (default: None)
     fill=bool                   Enable/disable fill (default: Depends)
     multiple=str                Change multiple behavior (default: 'layer')
+    decimate=int                Min-max decimate lines to int x buckets (default: 'auto')
+    fast=bool                   Bin hist/kde/scatter data with NumPy first (default: 'auto')
 File
     filetype=str    ft=str      Change filetype (default: 'svg')
     filename=str    fn=str      Custom filename
+    raster=bool                 Rasterize data, keep axes and text vector (default: False)
+    dpi=float                   Change raster resolution (default: 300 if raster)
 
 Spaces in expression/signal names are not supported!''')
 
 
-def draw(y, df, cmap):
+def hue_colors(param, df, cmap, default):
+    ''' Color of each hue level, matching seaborn's mapping for this palette '''
+    import matplotlib as mpl
+    import pandas as pd
+
+    if not param['hue']:
+        return {None: default}
+
+    if isinstance(df[param['hue']].dtype, pd.CategoricalDtype):
+        levels = list(df[param['hue']].cat.categories)
+    else:
+        levels = list(pd.unique(df[param['hue']].dropna()))
+
+    if isinstance(cmap, mpl.colors.Colormap):
+        levels.sort()
+        norm = mpl.colors.Normalize(min(levels), max(levels))
+        return {level: cmap(norm(level)) for level in levels}
+
+    return dict(zip(levels, cmap))
+
+
+def draw_lines(param, ax, y, df, cmap):
+    ''' Draw lines, aggregating repeated x values without bootstrapping '''
+    import seaborn as sns
+    from src import stats
+
+    by = [col for col in [param['hue'], param['style'], param['size']] if col]
+    repeated = df.duplicated([param['x']] + by).any()
+    kwargs = dict(ax=ax,
+                  x=param['x'],
+                  y=y,
+                  hue=param['hue'],
+                  style=param['style'],
+                  size=param['size'],
+                  alpha=param['alpha'],
+                  lw=param['width'] if param['width'] else 2,
+                  palette=cmap)
+
+    # Seaborn's own estimator for anything but the mean
+    if repeated and param['stat'] and param['stat'] != 'mean':
+        return sns.lineplot(data=df,
+                            estimator=param['stat'],
+                            errorbar=('ci', param['ci']),
+                            **kwargs)
+
+    if not repeated:
+        return sns.lineplot(data=decimate(param, df, y, ax.figure.dpi), estimator=None,
+                            errorbar=None, **kwargs)
+
+    df = stats.aggregate(df, param['x'], y, by, param['ci'])
+    ax = sns.lineplot(data=df, estimator=None, errorbar=None, **kwargs)
+    colors = hue_colors(param, df, cmap, ax.lines[-1].get_color() if ax.lines else None)
+    groups = df.groupby(by, sort=False, observed=True) if by else [((), df)]
+
+    for keys, group in groups:
+        level = group[param['hue']].iloc[0] if param['hue'] else None
+        group = group.sort_values(param['x'])
+        ax.fill_between(group[param['x']], group['lo'], group['hi'],
+                        color=colors[level], alpha=0.2, lw=0)
+
+    return ax
+
+
+def decimate(param, df, y, dpi):
+    ''' Min-max decimate each series to about one bucket per horizontal pixel '''
+    import numpy as np
+    from src import stats
+
+    if param['decimate'].lower() in ['none', 'false', 'f', 'no', 'n', '0']:
+        return df
+
+    if param['decimate'].lower() == 'auto':
+        buckets = int(param['figsize'][0] * dpi)
+    else:
+        buckets = int(param['decimate'])
+
+    by = [col for col in [param['hue'], param['style'], param['size']] if col]
+    if len(df) <= 4 * buckets:
+        return df
+
+    group = df.groupby(by, sort=False, dropna=False).ngroup() if by else 0
+
+    x = df[param['x']].where(df[param['x']] > 0) if param['logx'] else df[param['x']]
+    index = stats.minmax(np.log10(x) if param['logx'] else x, df[y],
+                         np.broadcast_to(group, len(df)), buckets)
+
+    return df.iloc[index]
+
+
+def draw(param, ax, y, df, cmap):
+    ''' Draw y on ax (or, for jointplots, on a new figure) and return its axes '''
+    from matplotlib.colors import LogNorm
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import numpy as np
+
     warnings.filterwarnings("ignore")
 
-    if 'joint' in param['ptype']:
-        ax = sns.jointplot(data=df,
-                           x=param['x'],
-                           y=y,
-                           kind=re.sub('joint', '', param['ptype']),
-                           height=param['figsize'][0],
-                           hue=param['hue'],
-                           palette=cmap,
-                           marginal_ticks=True)
+    kind = re.sub('joint', '', param['ptype'])
+
+    if 'joint' in param['ptype'] and kind in ['hist', 'kde', 'scatter', 'hex'] \
+            and fast(param, df):
+        # Binned marginals; the hist/kde branch below draws hist/kde joint
+        # axes, and pixel density colors by hue instead of splitting on it
+        grid = sns.JointGrid(height=param['figsize'][0], marginal_ticks=True)
+        plt.close(grid.figure)
+        margin = dict(param, fill=False, bins='auto', ptype=kind) if kind in ['hist', 'kde'] \
+            else dict(param, fill=False, bins='auto', ptype='hist', hue=None)
+        draw_dist(margin, grid.ax_marg_x, param['x'], None, df, cmap, legend=False)
+        draw_dist(margin, grid.ax_marg_y, y, None, df, cmap, vertical=True, legend=False)
+        ax = grid.ax_joint
+
+        # Colorbar beside the y marginal keeps the joint axes aligned with both margins
+        if kind in ['scatter', 'hex']:
+            ax = draw_density(param, ax, y, df, cmap,
+                              cax=grid.ax_marg_y.inset_axes([1.3, 0, .12, 1]))
+
+    elif 'joint' in param['ptype']:
+        # JointGrid always makes its own pyplot figure; unregister it at once
+        grid = sns.jointplot(data=df,
+                             x=param['x'],
+                             y=y,
+                             kind=re.sub('joint', '', param['ptype']),
+                             height=param['figsize'][0],
+                             hue=param['hue'],
+                             palette=cmap,
+                             marginal_ticks=True)
+        plt.close(grid.figure)
+        ax = grid.ax_joint
+
+    elif 'scatter' in param['ptype'] and fast(param, df):
+        ax = draw_density(param, ax, y, df, cmap)
 
     elif 'scatter' in param['ptype']:
-        ax = sns.scatterplot(data=df,
+        ax = sns.scatterplot(ax=ax,
+                             data=df,
                              x=param['x'],
                              y=y,
                              hue=param['hue'],
@@ -84,46 +228,41 @@ def draw(y, df, cmap):
                              palette=cmap)
 
     if 'line' in param['ptype']:
-        ax = sns.lineplot(data=df,
-                          x=param['x'],
-                          y=y,
-                          hue=param['hue'],
-                          style=param['style'],
-                          size=param['size'],
-                          alpha=param['alpha'],
-                          estimator=param['stat'] if param['stat'] else 'mean',
-                          lw=param['width'] if param['width'] else 2,
-                          errorbar=('ci', param['ci']),
-                          palette=cmap)
+        ax = draw_lines(param, ax, y, df, cmap)
+
+    elif 'heat' in param['ptype'] and (param['xbins'] or param['ybins']):
+        ax = draw_binned(param, ax, y, df, cmap)
 
     elif 'heat' in param['ptype']:
-        # TODO: Rounding is cringe, remove it
+        # TODO: Rounding is cringe, remove it (or use xbins/ybins)
         if not param['hue'] or param['size'] or param['style']:
             text.error('heatmap must have only x, y, and hue defined', 350)
 
-        if param['vlim']:
-            param['vlim'] = tuple(map(float, param['vlim'].strip('()').split(',')))
-        else:
-            param['vlim'] = (None, None)
-
+        df = df.copy(deep=False)
         df[param['x']] = np.round(df[param['x']], 1)
         df[y] = np.round(df[y], 1)
         df = df.pivot_table(columns=param['x'], index=y, values=param['hue'])
 
         if param['logv']:
-            ax = sns.heatmap(data=df,
+            ax = sns.heatmap(ax=ax,
+                             data=df,
                              cmap=cmap,
                              robust=True,
                              norm=LogNorm() if param['logv'] else None)
         else:
-            ax = sns.heatmap(data=df,
+            ax = sns.heatmap(ax=ax,
+                             data=df,
                              cmap=cmap,
                              robust=True,
                              vmin=param['vlim'][0],
                              vmax=param['vlim'][1])
 
-    if 'hist' in param['ptype']:
-        ax = sns.histplot(data=df,
+    if ('hist' in param['ptype'] or 'kde' in param['ptype']) and fast(param, df):
+        ax = draw_dist(param, ax, param['x'], y if y.lower() != 'none' else None, df, cmap)
+
+    elif 'hist' in param['ptype']:
+        ax = sns.histplot(ax=ax,
+                          data=df,
                           x=param['x'],
                           y=y if y.lower() != 'none' else None,
                           fill=not param['fill'],
@@ -137,7 +276,8 @@ def draw(y, df, cmap):
                           palette=cmap)
 
     elif 'kde' in param['ptype']:
-        ax = sns.kdeplot(data=df,
+        ax = sns.kdeplot(ax=ax,
+                         data=df,
                          x=param['x'],
                          y=y if y.lower() != 'none' else None,
                          fill=param['fill'],
@@ -152,11 +292,283 @@ def draw(y, df, cmap):
     return ax
 
 
-def draw_legend():
+def draw_binned(param, ax, y, df, cmap):
+    ''' Heatmap of a statistic of hue over x and y bins, drawn as one image '''
+    from matplotlib.colors import LogNorm, Normalize
+    import numpy as np
+    from src import stats
+
+    stat = param['stat'] if param['stat'] else 'mean' if param['hue'] else 'count'
+
+    if stat not in ['mean', 'min', 'max', 'sum', 'count']:
+        text.error(f'binned heatmap stat must be mean, min, max, sum, or count, not {stat}', 351)
+    if param['size'] or param['style'] or not (param['hue'] or stat == 'count'):
+        text.error('binned heatmap must have only x, y, and hue (or stat=count) defined', 350)
+
+    x = df[param['x']].to_numpy(dtype=float)
+    values = df[y].to_numpy(dtype=float)
+    xedges = stats.edges(x, param['xbins'] or param['bins'], param['logx'])
+    yedges = stats.edges(values, param['ybins'] or param['bins'], param['logy'])
+
+    grid = stats.binned(x, values, None if stat == 'count' else
+                        df[param['hue']].to_numpy(dtype=float), xedges, yedges, stat)
+    norm = (LogNorm if param['logv'] else Normalize)(*param['vlim'])
+
+    # An image needs evenly spaced bins; anything else is one QuadMesh
+    if not (param['logx'] or param['logy']) \
+            and np.allclose(np.diff(xedges), xedges[1] - xedges[0]) \
+            and np.allclose(np.diff(yedges), yedges[1] - yedges[0]):
+        artist = ax.imshow(grid, cmap=cmap, norm=norm, origin='lower', aspect='auto',
+                           interpolation='nearest',
+                           extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]))
+    else:
+        artist = ax.pcolormesh(xedges, yedges, grid, cmap=cmap, norm=norm)
+
+    ax.grid(False)
+    ax.figure.colorbar(artist, ax=ax, shrink=.75,
+                       label='count' if stat == 'count' else
+                       param['hue'] if stat == 'mean' else f"{param['hue']} ({stat})")
+
+    return ax
+
+
+def fast(param, df):
+    ''' Whether hist/kde should bin the data with NumPy instead of in Seaborn '''
+    return len(df) > FAST_ROWS if param['fast'] == 'auto' else param['fast']
+
+
+def split(param, df, columns, cmap):
+    ''' Level, color, and finite values of columns for each hue level, in hue order '''
+    import numpy as np
+
+    data = df[columns].to_numpy(dtype=float)
+    finite = np.isfinite(data).all(axis=1)
+
+    if not param['hue']:
+        return [(None, None, data[finite].T)]
+
+    groups = df.groupby(param['hue'], sort=False, observed=True).indices
+
+    return [(level, color, data[groups[level]][finite[groups[level]]].T)
+            for level, color in hue_colors(param, df, cmap, None).items()
+            if level in groups]
+
+
+def draw_hist(param, ax, x, y, df, parts, cmap, vertical, legend):
+    ''' Seaborn histogram of per-level NumPy bin counts instead of raw samples '''
+    import numpy as np
+    import pandas as pd
+    import seaborn as sns
+
+    columns = [x] if y is None else [x, y]
+    edges = [np.histogram_bin_edges(np.concatenate([values[i] for _, _, values in parts]),
+                                    param['bins']) for i in range(len(columns))]
+
+    frames = list()
+    for level, _, values in parts:
+        counts, _ = np.histogramdd(values.T, edges)
+        index = np.nonzero(counts)
+        frame = {column: ((edge[:-1] + edge[1:]) / 2)[i]
+                 for column, edge, i in zip(columns, edges, index)}
+        frame['weight'] = counts[index]
+        if param['hue']:
+            frame[param['hue']] = np.repeat(level, len(counts[index]))
+        frames.append(pd.DataFrame(frame))
+
+    binned = pd.concat(frames, ignore_index=True)
+    if param['hue']:
+        binned[param['hue']] = binned[param['hue']].astype(df[param['hue']].dtype)
+
+    return sns.histplot(ax=ax,
+                        data=binned,
+                        x=x if not vertical else None,
+                        y=y if y else x if vertical else None,
+                        weights='weight',
+                        bins=list(edges[0]) if y is None else [list(edge) for edge in edges],
+                        fill=not param['fill'],
+                        stat=param['stat'] if param['stat'] else 'count',
+                        hue=param['hue'],
+                        multiple=param['multiple'],
+                        cbar=y is not None,
+                        cbar_kws=dict(shrink=.75) if y is not None else None,
+                        legend=legend,
+                        palette=cmap,
+                        **(dict(alpha=.5) if 'kde' in param['ptype'] and not param['fill']
+                           else dict())), edges
+
+
+def draw_kde(param, ax, parts, scale, cut, vertical):
+    ''' KDE curves of each hue level, scaled by scale(samples), styled like Seaborn '''
+    from matplotlib import rcParams
+    from matplotlib.colors import to_rgba
+    import numpy as np
+    from src import stats
+
+    # Stacking needs every level on one common grid
+    support = None
+    if param['multiple'] in ['stack', 'fill']:
+        bw = max(stats.scott(values[0]) for _, _, values in parts)
+        support = (min(values[0].min() for _, _, values in parts) - cut * bw,
+                   max(values[0].max() for _, _, values in parts) + cut * bw)
+
+    curves = list()
+    for level, color, values in parts:
+        grid, density = stats.kde(values[0], support, cut=cut)
+        if grid is not None:
+            curves.append((level, color, grid, density * scale(len(values[0]))))
+
+    # Stacks read top to bottom in hue order, so accumulate from the last level
+    tops = [curve[3] for curve in curves]
+    if support:
+        tops = list(np.cumsum(tops[::-1], axis=0)[::-1])
+    if support and param['multiple'] == 'fill':
+        tops = [top / tops[0] for top in tops]
+    bases = tops[1:] + [0] if support else [0] * len(tops)
+
+    for index, ((level, color, grid, _), top, base) in enumerate(zip(curves, tops, bases)):
+        label = None if level is None else f'{level:g}' if isinstance(level, float) else level
+        zorder = 2 - index / len(curves)
+
+        if param['fill']:
+            fill = ax.fill_betweenx if vertical else ax.fill_between
+            artist = fill(grid, base, top, label=label, zorder=zorder - 1,
+                          facecolor=to_rgba(color if color else 'C0',
+                                            .25 if not support else .75),
+                          edgecolor=color if not support else rcParams['patch.edgecolor'],
+                          lw=param['width'] if param['width'] else None)
+        else:
+            artist, = ax.plot(*((top, grid) if vertical else (grid, top)), label=label,
+                              color=color, zorder=zorder,
+                              lw=param['width'] if param['width'] else 2)
+
+        # No autoscale margin below zero density
+        sticky = artist.sticky_edges.x if vertical else artist.sticky_edges.y
+        sticky[:] = (0, 1) if param['multiple'] == 'fill' else (0, np.inf)
+
+    return ax
+
+
+def draw_kde2d(param, ax, parts, total):
+    ''' Iso-proportion KDE contours of each hue level, common-normalized like Seaborn '''
+    import numpy as np
+    import seaborn as sns
+    from src import stats
+
+    densities = list()
+    for level, color, values in parts:
+        xgrid, ygrid, density = stats.kde2d(*values)
+        if xgrid is not None:
+            densities.append((color, xgrid, ygrid, density * len(values[0]) / total))
+
+    if not densities:
+        return ax
+
+    levels = np.unique(stats.quantile_levels(
+        np.concatenate([density.ravel() for *_, density in densities]),
+        np.linspace(0.05, 1, param['bins'])))
+
+    for index, (color, xgrid, ygrid, density) in enumerate(densities):
+        color = color if color else f'C{index}'
+        if param['fill']:
+            # The top quantile level is already the overall maximum
+            cset = ax.contourf(xgrid, ygrid, density,
+                               levels=np.unique(np.r_[levels, density.max()]),
+                               cmap=sns.light_palette(color, as_cmap=True))
+        else:
+            cset = ax.contour(xgrid, ygrid, density, levels=levels, colors=[color],
+                              linewidths=param['width'] if param['width'] else None)
+
+    if not param['hue']:
+        ax.figure.colorbar(cset, ax=ax, shrink=.75)
+
+    return ax
+
+
+def draw_dist(param, ax, x, y, df, cmap, vertical=False, legend=True):
+    ''' Histogram and/or KDE of x (or x and y) from per-level NumPy binning '''
+    import numpy as np
+
+    parts = split(param, df, [x] if y is None else [x, y], cmap)
+    total = sum(len(values[0]) for _, _, values in parts)
+
+    if not total:
+        return ax
+
+    if y is not None:
+        if 'hist' in param['ptype']:
+            return draw_hist(param, ax, x, y, df, parts, cmap, vertical, legend)[0]
+        return draw_kde2d(param, ax, parts, total)
+
+    if 'hist' not in param['ptype']:
+        return draw_kde(param, ax, parts, lambda n: n / total, 3, vertical)
+
+    ax, edges = draw_hist(param, ax, x, y, df, parts, cmap, vertical, legend)
+
+    # Overlaid KDEs span the data and enclose the same area as their bars
+    if 'kde' in param['ptype']:
+        width = np.diff(edges[0]).mean()
+        area = {'count': width, 'frequency': 1, 'density': 1 / total,
+                'probability': width / total, 'proportion': width / total,
+                'percent': 100 * width / total}[param['stat'] if param['stat'] else 'count']
+        draw_kde(dict(param, fill=False, multiple='layer'), ax,
+                 [(None, color, values) for _, color, values in parts],
+                 lambda n: n * area, 0, vertical)
+
+    return ax
+
+
+def draw_density(param, ax, y, df, cmap, cax=None):
+    ''' Count (or mean hue) of the points falling in each pixel of ax, as one image '''
+    from matplotlib.colors import Colormap, LinearSegmentedColormap, LogNorm, Normalize
+    import numpy as np
+    import pandas as pd
+    from src import stats
+
+    # One bin per output pixel of the axes
+    scale = (param['dpi'] if param['dpi'] else ax.figure.dpi) / ax.figure.dpi
+    nx, ny = np.maximum((ax.get_window_extent().size * scale).astype(int), 1)
+
+    numeric = param['hue'] and pd.api.types.is_numeric_dtype(df[param['hue']])
+    stat = 'count' if not numeric else param['stat'] \
+        if param['stat'] in ['mean', 'min', 'max', 'sum'] else 'mean'
+
+    x = df[param['x']].to_numpy(dtype=float)
+    values = df[y].to_numpy(dtype=float)
+    xedges = stats.edges(x, nx, param['logx'])
+    yedges = stats.edges(values, ny, param['logy'])
+    grid = stats.binned(x, values, None if stat == 'count' else
+                        df[param['hue']].to_numpy(dtype=float), xedges, yedges, stat)
+
+    if not isinstance(cmap, Colormap):
+        cmap = LinearSegmentedColormap.from_list('hue', cmap)
+    norm = LogNorm(*param['vlim']) if stat == 'count' or param['logv'] \
+        else Normalize(*param['vlim'])
+
+    # Log axes need a mesh, which is rasterized to keep vector output small
+    if param['logx'] or param['logy']:
+        artist = ax.pcolormesh(xedges, yedges, grid, cmap=cmap, norm=norm, rasterized=True)
+    else:
+        artist = ax.imshow(grid, cmap=cmap, norm=norm, origin='lower', aspect='auto',
+                           interpolation='nearest',
+                           extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]))
+
+    ax.set_xlabel(param['x'])
+    ax.set_ylabel(y)
+    ax.figure.colorbar(artist, ax=None if cax else ax, cax=cax, shrink=.75,
+                       label='count' if stat == 'count' else
+                       param['hue'] if stat == 'mean' else f"{param['hue']} ({stat})")
+
+    return ax
+
+
+def draw_legend(param, ax):
     if param['bbox'] == 'none' or 'heat' in param['ptype'] or not param['ltitle']:
         return
 
-    handles, labels = plt.gca().get_legend_handles_labels()
+    # Nothing to label and no seaborn legend to replace, e.g. pixel density
+    handles, labels = ax.get_legend_handles_labels()
+    if not handles and ax.get_legend() is None:
+        return
 
     if len(param['y']) > 1:
         r = len(labels) // len(param['y'])
@@ -165,44 +577,42 @@ def draw_legend():
                 labels[i] = f'{wave} ' + labels[i]
 
     if param['bbox'] == 'center':
-        plt.legend(handles,
-                   labels,
-                   loc='upper center',
-                   bbox_to_anchor=(.5, 1.25),
-                   ncol=len(handles),
-                   title=param['ltitle']
-                   if param['ltitle'].lower() != 'none' else None,
-                   borderaxespad=0)
+        ax.legend(handles,
+                  labels,
+                  loc='upper center',
+                  bbox_to_anchor=(.5, 1.25),
+                  ncol=len(handles),
+                  title=param['ltitle']
+                  if param['ltitle'].lower() != 'none' else None,
+                  borderaxespad=0)
 
     else:
-        plt.legend(handles,
-                   labels,
-                   loc='upper left' if param['bbox'] != 'inside' else None,
-                   bbox_to_anchor=(1.02, 1) if param['bbox'] != 'inside' else None,
-                   title=param['ltitle']
-                   if param['ltitle'].lower() != 'none' else None,
-                   borderaxespad=0)
+        ax.legend(handles,
+                  labels,
+                  loc='upper left' if param['bbox'] != 'inside' else None,
+                  bbox_to_anchor=(1.02, 1) if param['bbox'] != 'inside' else None,
+                  title=param['ltitle']
+                  if param['ltitle'].lower() != 'none' else None,
+                  borderaxespad=0)
 
 
-def draw_labels(ax):
+def draw_labels(param, ax):
     # Label axes
     if param['xlabel'].lower() == 'none':
-        plt.xlabel(None)
+        ax.set_xlabel(None)
     else:
-        plt.xlabel(param['xlabel'])
+        ax.set_xlabel(param['xlabel'])
 
     if param['ylabel'].lower() == 'none':
-        plt.ylabel(None)
+        ax.set_ylabel(None)
     else:
-        plt.ylabel(param['ylabel'])
+        ax.set_ylabel(param['ylabel'])
 
     # Set axes limits
     if param['xlim']:
-        param['xlim'] = tuple(map(float, param['xlim'].strip('()').split(',')))
-        plt.xlim(param['xlim'])
+        ax.set_xlim(tuple(map(float, param['xlim'].strip('()').split(','))))
     if param['ylim']:
-        param['ylim'] = tuple(map(float, param['ylim'].strip('()').split(',')))
-        plt.ylim(param['ylim'])
+        ax.set_ylim(tuple(map(float, param['ylim'].strip('()').split(','))))
     if param['logx']:
         ax.set_xscale('log')
     if param['logy']:
@@ -211,6 +621,13 @@ def draw_labels(ax):
     return ax
 
 
+def rasterize(fig):
+    ''' Rasterize data artists; axes, text, and legends stay vector '''
+    for ax in fig.axes:
+        for artist in ax.collections + ax.lines + ax.patches + ax.images:
+            artist.set_rasterized(True)
+
+
 def key_expander(key):
     conversion = {
         'h': 'hue',
@@ -239,7 +656,7 @@ def key_expander(key):
     return conversion[key] if key in conversion else key
 
 
-def augment_param():
+def augment_param(param):
     # Fix data types
     param['y'] = re.sub(r'\s+', '', param['y']).strip('{[()]}').split(',')
     param['palette'] = re.sub(r'\s+', '', param['palette']).strip('{[()]}').split(',')
@@ -251,7 +668,11 @@ def augment_param():
     param['logy'] = param['logy'].lower() in ['t', 'true', 'yes', 'y', '1']
     param['logx'] = param['logx'].lower() in ['t', 'true', 'yes', 'y', '1']
     param['logv'] = param['logv'].lower() in ['t', 'true', 'yes', 'y', '1']
+    param['raster'] = param['raster'].lower() in ['t', 'true', 'yes', 'y', '1']
+    param['dpi'] = float(param['dpi']) if param['dpi'] else 300 if param['raster'] else None
     param['fill'] = bool(param['fill'])
+    if param['fast'].lower() != 'auto':
+        param['fast'] = param['fast'].lower() in ['t', 'true', 'yes', 'y', '1']
     param['bins'] = int(param['bins'])
     param['xscale'] = float(param['xscale'])
     param['yscale'] = float(param['yscale'])
@@ -263,8 +684,16 @@ def augment_param():
         param['ylim'] = None
     if param['xlim'] and 'none' in param['xlim'].lower():
         param['xlim'] = None
-    if param['vlim'] and 'none' in param['vlim'].lower():
-        param['vlim'] = None
+    if param['vlim'] and 'none' not in param['vlim'].lower():
+        param['vlim'] = tuple(map(float, param['vlim'].strip('()').split(',')))
+    else:
+        param['vlim'] = (None, None)
+
+    # An int is a bin count, a list is the bin edges
+    for key in ['xbins', 'ybins']:
+        if param[key]:
+            bins = re.sub(r'\s+', '', param[key]).strip('{[()]}').split(',')
+            param[key] = int(bins[0]) if len(bins) == 1 else list(map(float, bins))
 
     # Set labels
     if not param['ylabel']:
@@ -287,7 +716,7 @@ def augment_param():
     return param
 
 
-def rescale(df):
+def rescale(param, df):
     if param['xscale'] != 1:
         df[param['x']] = df[param['x']] * param['xscale']
     if param['yscale'] != 1:
@@ -300,8 +729,53 @@ def rescale(df):
     return df
 
 
+def reduce(chunks, kwargs):
+    ''' Concatenate the columns this plot needs from a chunk iterator, in at most maxrows rows '''
+    import pandas as pd
+
+    df, chunks = tools.peek(iter(chunks))
+
+    keys = {'x': df.columns[0], 'y': df.columns[1], 'maxrows': MAX_ROWS}
+    for arg in kwargs:
+        key, _, value = arg.partition('=')
+        if key_expander(key) in ['x', 'y', 'hue', 'style', 'size', 'maxrows']:
+            keys[key_expander(key)] = value
+
+    needed = [keys['x']] + re.sub(r'\s+', '', keys['y']).strip('{[()]}').split(',')
+    needed += [keys[key] for key in ['hue', 'style', 'size'] if key in keys]
+    needed = [col for col in dict.fromkeys(needed) if col in df.columns]
+    maxrows = int(float(keys['maxrows']))
+
+    # Keep every stride-th row of the whole stream, doubling stride whenever
+    # the rows kept so far exceed maxrows, so memory stays bounded
+    kept, stride, seen = list(), 1, 0
+    for chunk in chunks:
+        kept.append(chunk[needed].iloc[-seen % stride::stride])
+        seen += len(chunk)
+
+        if sum(map(len, kept)) > maxrows:
+            kept, stride = [pd.concat(kept, ignore_index=True).iloc[::2]], stride * 2
+
+    if stride > 1:
+        text.cprint('WARNING',
+                    f'Plotting 1 in {stride} of {seen} streamed rows (maxrows={maxrows})')
+
+    return pd.concat(kept, ignore_index=True)
+
+
 def plot(df, kwargs):
-    global param
+    ''' Draw df on a new figure, save it, and return the filename written '''
+    # Imported here so `-h replot` does not pay for them; never start an
+    # interactive backend
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    import seaborn as sns
+    import pandas as pd
+
+    # Work on a shallow copy so added or converted columns stay local
+    df = df.copy(deep=False) if hasattr(df, 'columns') else reduce(df, kwargs)
+
     param = {
         'figsize': '6,3',
         'alpha': 0.8,
@@ -329,13 +803,20 @@ def plot(df, kwargs):
         'width': None,
         'ci': 95,
         'bins': 10,
+        'xbins': None,
+        'ybins': None,
         'fill': False,
         'stat': None,
         'multiple': 'layer',
+        'decimate': 'auto',
+        'fast': 'auto',
+        'raster': 'F',
+        'dpi': None,
         'xscale': 1,
         'yscale': 1,
         'hscale': 1,
-        'sscale': 1
+        'sscale': 1,
+        'maxrows': MAX_ROWS
     }
 
     # Read kwargs
@@ -348,30 +829,20 @@ def plot(df, kwargs):
             text.error(f'Unable to decode arg {arg} ({e})')
 
     # Fix param variable types
-    param = augment_param()
+    param = augment_param(param)
 
-    # Set figure size and type
-    plt.figure(figsize=param['figsize'])
-    sns.set_style(param['axes'])
-    sns.set_context(param['context'])
+    # Compact ingest stores sweep parameters as categoricals
+    for col in [param['x'], param['hue'], param['size']] + param['y']:
+        if col in df and isinstance(df[col].dtype, pd.CategoricalDtype) \
+                and pd.api.types.is_numeric_dtype(df[col].cat.categories):
+            df[col] = df[col].astype(float)
 
-    # Change hue column to floats
-    if param['hue']:
+    # Change numeric hue column to floats
+    if param['hue'] and pd.api.types.is_numeric_dtype(df[param['hue']]):
         df[param['hue']] = df[param['hue']].astype(float)
 
     # Rescale (avoid multiplication duplication if possible)
-    df = rescale(df)
-
-    # Draw plots!
-    for index, y in enumerate(param['y']):
-        palette = param['palette'][index % len(param['palette'])]
-        cmap = sns.color_palette(palette, as_cmap=True)
-        ax = draw(y, df, cmap)
-
-    ax = draw_labels(ax)
-    # ax.set_xticklabels(np.array([f'{i:2.3f}' for i in plt.xticks()[0]]))
-    draw_legend()
-    plt.tight_layout()
+    df = rescale(param, df)
 
     # Write out
     if param['filename']:
@@ -383,6 +854,31 @@ def plot(df, kwargs):
     allow = tools.query(f'Overwrite {filename}?', 'yes') \
         if os.path.isfile(filename) else True
 
-    if allow:
-        plt.savefig(filename)
-        text.cprint('OKGREEN', f'Output:  {os.path.realpath(filename)}')
+    if not allow:
+        return None
+
+    # Figures are never registered with pyplot, so they are freed on return
+    with LOCK, sns.axes_style(param['axes']), sns.plotting_context(param['context']):
+        fig = Figure(figsize=param['figsize'])
+        ax = fig.subplots()
+
+        # Draw plots!
+        for index, y in enumerate(param['y']):
+            palette = param['palette'][index % len(param['palette'])]
+            if param['hue'] and not pd.api.types.is_numeric_dtype(df[param['hue']]):
+                cmap = sns.color_palette(palette, n_colors=df[param['hue']].nunique())
+            else:
+                cmap = sns.color_palette(palette, as_cmap=True)
+            ax = draw(param, ax, y, df, cmap)
+
+        ax = draw_labels(param, ax)
+        draw_legend(param, ax)
+        ax.figure.tight_layout()
+
+        if param['raster']:
+            rasterize(ax.figure)
+
+        ax.figure.savefig(filename, dpi=param['dpi'] if param['dpi'] else 'figure')
+
+    text.cprint('OKGREEN', f'Output:  {os.path.realpath(filename)}')
+    return filename
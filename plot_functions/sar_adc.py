@@ -6,12 +6,11 @@
 # differential comparator (input a waveform representing COMP+ - COMP-).
 
 import sys
-import numpy as np
-import pandas as pd
 from src import text
-from scipy import signal
 from plot_functions import replot
 
+KWARGS = ['time', 'comp', 'var', 'prom', 'height', 'bits', 'dnl', 'inl', 'tail', 'jobs']
+
 
 def usage():
     print(f'{sys.argv[0]} [options] sar_adc INPUT [kwargs]')
@@ -23,11 +22,34 @@ def usage():
     height=float    Change height for peak finding (default: prom)
     bits=int        Set number of bits (opt; performs sanity checks)
     dnl=bool        Enable DNL, requires var == code voltage (default: True)
-    inl=bool        Enable INL, requires var == code voltage (default: False)
-    tail=int        Display this number of the worst DNL (default: 0)''')
+    inl=bool        Enable INL and endpoint/best-fit INL in LSB (inl_end, inl_fit),
+                    requires var == code voltage (default: False)
+    tail=int        Display this number of the worst DNL (default: 0)
+    jobs=int        Search for peaks in this many worker processes (default: 1)''')
+
+
+def signs(wave, starts, prom, height):
+    ''' Bits of each run of wave beginning at starts: its peaks in time order, 1 if + '''
+    from scipy import signal
+    import numpy as np
+
+    bits = list()
+
+    for segment in np.split(wave, starts[1:]):
+        pos, _ = signal.find_peaks(segment, prominence=prom, height=height)
+        neg, _ = signal.find_peaks(-segment, prominence=prom, height=height)
+        bits.append(np.isin(np.sort(np.concatenate([pos, neg])), pos).astype(np.int8))
+
+    return bits
 
 
 def plot(df, kwargs):
+    from concurrent.futures import ProcessPoolExecutor
+    import numpy as np
+    import pandas as pd
+    from src import stats
+    from src import decode
+
     param = {
         'time': df.columns[0],
         'comp': df.columns[1],
@@ -37,7 +59,8 @@ def plot(df, kwargs):
         'bits': 0,
         'inl': False,
         'dnl': True,
-        'tail': 0
+        'tail': 0,
+        'jobs': 1
     }
 
     # Parse kwargs
@@ -51,56 +74,47 @@ def plot(df, kwargs):
     param['dnl'] = bool(param['dnl'])
     param['tail'] = int(param['tail'])
     param['bits'] = int(param['bits'])
-
-    codes = list()
-
-    for var in np.unique(df[param['var']]):
-        # Extract wave
-        wave = df.loc[df[param['var']] == var, [param['comp']]].squeeze()
-
-        # Find peaks
-        pos = signal.find_peaks(wave,
-                                prominence=param['prom'],
-                                height=param['height'])
-        neg = signal.find_peaks(wave * -1,
-                                prominence=param['prom'],
-                                height=param['height'])
-
-        # Check bitwidth == number of peaks found
-        if param['bits'] and len(pos[0]) + len(neg[0]) != param['bits']:
-            text.error(f'Failed to decode {param["var"]} = {var} ({len(pos[0])}+ {len(neg[0])}-)')
-
-        peaks = {key: "+" for key in pos[0]} | {key: "-" for key in neg[0]}
-
-        # Convert into code
-        code = 0
-        for i, (time, sign) in enumerate(sorted(peaks.items())):
-            if sign == "+":
-                code = code + (2**(len(peaks) - 1 - i))
-
-        codes.append((var, code))
-
-    df_out = pd.DataFrame(np.array(codes), columns=[param['var'], 'code'])
-    df_out['code'] = df_out['code'].astype(int)
-
-    if param['dnl']:
-        df_out['dnl'] = np.append(
-            np.array(df_out["code"][1:]) - np.array(df_out["code"][0:-1]),
-            np.nan)
-        df_out['abs_dnl'] = np.abs(df_out['dnl'])
-        if param['tail']:
-            print(
-                df_out.sort_values("abs_dnl",
-                                   ascending=False)[[param["var"],
-                                                     "dnl"]][0:param['tail']])
-
-    if param['inl'] and param['bits']:
-        vmax = np.max(df[param['var']])
-        vmin = np.min(df[param['var']])
-        codespace = np.linspace(vmin, vmax, num=2**param['bits'])
-        df_out['inl'] = [codespace[int(i)] for i in df_out["code"]]
-    elif param['inl']:
-        text.error('Bitwidth not specified; cannot compute INL')
+    param['jobs'] = int(param['jobs'])
+
+    # Sort once (stably, so each wave stays in time order) and split into runs
+    var = df[param['var']].to_numpy()
+    order = np.argsort(var, kind='stable')
+    order = order[~pd.isna(var[order])]
+    var = var[order]
+    wave = df[param['comp']].to_numpy(dtype=float)[order]
+    starts, _ = stats.segments(var)
+
+    # Workers each get a contiguous block of whole waves
+    if param['jobs'] > 1 and len(starts) > 1:
+        blocks = np.array_split(np.arange(len(starts)), param['jobs'] * 4)
+        blocks = [block for block in blocks if len(block)]
+        bounds = [(starts[block[0]], starts[block[-1] + 1] if block[-1] + 1 < len(starts)
+                   else len(wave)) for block in blocks]
+
+        with ProcessPoolExecutor(max_workers=param['jobs']) as pool:
+            results = pool.map(signs, [wave[lo:hi] for lo, hi in bounds],
+                               [starts[block] - lo for block, (lo, _) in zip(blocks, bounds)],
+                               [param['prom']] * len(blocks), [param['height']] * len(blocks))
+            rows = [row for block in results for row in block]
+    else:
+        rows = signs(wave, starts, param['prom'], param['height'])
+
+    # Each peak is one bit, MSB first
+    matrix = decode.pack(rows)
+    pos = matrix.sum(axis=1)
+    neg = np.array([len(row) for row in rows]) - pos
+
+    # Check bitwidth == number of peaks found
+    if param['bits']:
+        for index in np.flatnonzero(pos + neg != param['bits']):
+            text.error(f'Failed to decode {param["var"]} = {var[starts[index]]} '
+                       f'({pos[index]}+ {neg[index]}-)')
+
+    df_out = pd.DataFrame({param['var']: var[starts],
+                           'code': decode.codes(matrix).astype(int)})
+
+    df_out = decode.linearity(df_out, param['var'], param['bits'],
+                              param['dnl'], param['inl'], param['tail'])
 
     # Call replot
-    replot.plot(df_out, kwargs)
+    return replot.plot(df_out, kwargs)
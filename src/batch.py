@@ -0,0 +1,118 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import io
+import os
+import sys
+import shlex
+import contextlib
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+from src import tools
+from src import text
+from src import cache
+from src import registry
+
+# DataFrames and plot functions, inherited (not pickled) by forked workers
+SHARED = dict()
+
+
+def read_manifest(filename, filetype='wave'):
+    ''' Parse a manifest of `[-t TYPE] PLOT INPUT [INPUT ...] [kwargs]` lines into jobs '''
+    jobs = list()
+
+    with open(filename) as fin:
+        for number, line in enumerate(fin, 1):
+            try:
+                args = shlex.split(line, comments=True)
+            except ValueError as e:
+                text.error(f'{filename}:{number}: {e}', 105)
+
+            if not args:
+                continue
+
+            # Input file type may be set per line
+            line_type = filetype
+            if args[0] == '-t' or args[0] == '--type':
+                line_type = args[1].lower() if len(args) > 1 else None
+                args = args[2:]
+
+            if not args:
+                text.error(f'{filename}:{number}: Not enough arguments', 105)
+
+            inputs, kwargs = tools.split_inputs(args[1:])
+            if not inputs:
+                text.error(f'{filename}:{number}: No INPUT specified', 105)
+
+            jobs.append((args[0], (tuple(inputs), line_type), kwargs))
+
+    return jobs
+
+
+def inputs(jobs):
+    ''' Distinct (INPUTs, file type) pairs in the order they first appear '''
+    return list(dict.fromkeys(job[1] for job in jobs))
+
+
+def header(job):
+    ''' Print the `[i/n] PLOT kwargs` line that starts each job's output '''
+    index, total, plot, _, kwargs = job
+    text.cprint('OKBLUE', f'[{index + 1}/{total}] {plot} {" ".join(kwargs[2:])}')
+
+
+def render(job, capture=False):
+    ''' Render one (index, total, plot, key, kwargs) job against its shared DataFrame '''
+    index, total, plot, key, kwargs = job
+    result = None
+    printed = io.StringIO()
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    with contextlib.ExitStack() as stack:
+        if capture:
+            stack.enter_context(contextlib.redirect_stdout(stdout))
+            stack.enter_context(contextlib.redirect_stderr(stderr))
+
+        header(job)
+        start = perf_counter()
+
+        # Each job gets its own column index over the shared data
+        try:
+            with contextlib.redirect_stdout(cache.Recorder(sys.stdout)) as printed:
+                result = SHARED['functions'][plot].plot(
+                    SHARED['frames'][key].copy(deep=False), kwargs)
+            failed = False
+        except (Exception, SystemExit) as e:
+            text.error(f'Job {index} ({plot}) failed ({e})')
+            failed = True
+
+        elapsed = perf_counter() - start
+
+    # Only output filenames go back to the parent, not whatever else a plot returns
+    if not isinstance(result, (str, list, tuple)):
+        result = None
+
+    return elapsed, failed, stdout.getvalue(), stderr.getvalue(), result, printed.getvalue()
+
+
+def render_all(jobs, frames, functions, workers=None):
+    ''' Render jobs in forked worker processes, yielding results in job order '''
+    SHARED['frames'] = frames
+    SHARED['functions'] = functions
+    workers = min(workers or os.cpu_count(), len(jobs))
+
+    if workers < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        yield from map(render, jobs)
+        return
+
+    # Forked workers share the parent's DataFrames, plotting stack, and plot
+    # functions copy-on-write; only the job tuples and captured output are pickled
+    registry.warm({plot: functions[plot] for plot in dict.fromkeys(job[2] for job in jobs)})
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('fork')) as pool:
+        for result in pool.map(render, jobs, [True] * len(jobs)):
+            sys.stdout.write(result[2])
+            sys.stderr.write(result[3])
+            yield result
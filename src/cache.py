@@ -0,0 +1,294 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import io
+import os
+import re
+import sys
+import json
+import shutil
+import filecmp
+import hashlib
+from collections import OrderedDict
+
+from src import tools
+from src.text import error, cprint
+
+# In-memory DataFrames kept between requests by the server (disabled at 0 bytes)
+MEMORY = OrderedDict()
+MEMORY_LIMIT = 0
+
+
+def key(filename, filetype, version):
+    ''' Identify an ingest by input file, ingest type, and tool version '''
+    stat = os.stat(filename)
+    ident = '|'.join([os.path.realpath(filename), str(stat.st_size),
+                      str(stat.st_mtime_ns), filetype, version])
+
+    return hashlib.sha256(ident.encode()).hexdigest()
+
+
+def load(cache_dir, digest):
+    filename = os.path.join(cache_dir, f'{digest}.pkl')
+
+    if not os.path.isfile(filename):
+        return None
+
+    import pandas as pd
+
+    try:
+        df = pd.read_pickle(filename)
+    except Exception as e:
+        error(f'Could not read cached ingest `{filename}` ({e})')
+        return None
+
+    # Touch for least-recently-used eviction
+    os.utime(filename)
+    return df
+
+
+def store(cache_dir, digest, df, limit):
+    filename = os.path.join(cache_dir, f'{digest}.pkl')
+    temp_file = f'{filename}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_pickle(temp_file, protocol=5)
+        os.replace(temp_file, filename)
+    except Exception as e:
+        error(f'Could not write cached ingest `{filename}` ({e})')
+        return
+
+    evict(cache_dir, limit)
+
+
+def scan(cache_dir, keep):
+    ''' (entry, stat) of each file in cache_dir whose name keep accepts, oldest first '''
+    found = list()
+    for entry in os.scandir(cache_dir):
+        # Other processes evict from the same directory concurrently
+        try:
+            if entry.is_file() and keep(entry.name):
+                found.append((entry, entry.stat()))
+        except FileNotFoundError:
+            continue
+
+    return sorted(found, key=lambda item: item[1].st_mtime)
+
+
+def remove(filename):
+    ''' Remove filename unless another process already has '''
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def evict(cache_dir, limit):
+    ''' Remove least-recently-used entries until the cache fits in limit bytes '''
+    entries = scan(cache_dir, lambda name: name.endswith('.pkl'))
+    total = sum(stat.st_size for _, stat in entries)
+
+    for entry, stat in entries:
+        if total <= limit:
+            break
+
+        total -= stat.st_size
+        remove(entry.path)
+
+
+def clear(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return
+
+    for entry in os.scandir(cache_dir):
+        if entry.is_file():
+            os.remove(entry.path)
+
+
+def ingest_cached(filename, filetype, version, cache_dir, limit):
+    ''' Ingest filename, reusing a cached DataFrame when one exists '''
+    from src import ingest
+
+    digest = key(filename, filetype, version)
+    df = load(cache_dir, digest)
+
+    if df is None:
+        df = ingest.ingest(filename, filetype)
+        store(cache_dir, digest, df, limit)
+
+    return df
+
+
+def recall(digest):
+    ''' DataFrame remembered under digest, or None '''
+    if digest not in MEMORY:
+        return None
+
+    # Most recently used entries are at the end
+    MEMORY.move_to_end(digest)
+    return MEMORY[digest][0].copy(deep=False)
+
+
+def remember(digest, df):
+    ''' Keep df in memory, forgetting least-recently-used entries over MEMORY_LIMIT '''
+    if not MEMORY_LIMIT or not hasattr(df, 'columns'):
+        return
+
+    size = df.memory_usage(deep=True).sum()
+    if size > MEMORY_LIMIT:
+        return
+
+    # Plot functions change the frame they are given, so keep a copy of our own
+    MEMORY[digest] = (df.copy(deep=False), size)
+    MEMORY.move_to_end(digest)
+
+    while sum(size for _, size in MEMORY.values()) > MEMORY_LIMIT:
+        MEMORY.popitem(last=False)
+
+
+def stamp(directories):
+    ''' Latest modification time of the Python sources in directories '''
+    return max((entry.stat().st_mtime_ns for directory in directories if os.path.isdir(directory)
+                for entry in os.scandir(directory) if entry.name.endswith('.py')), default=0)
+
+
+def render_key(plot, inputs, filetype, kwargs, version, *extra, expand=None):
+    ''' Identify a render by plot function, ingest digests, normalized kwargs, and version '''
+    # Later kwargs override earlier ones, so only the last of each name counts,
+    # once aliases are expanded (e.g. h to hue)
+    settings = dict()
+    for kwarg in kwargs:
+        name, _, value = re.sub(r'\s*=\s*', '=', kwarg.strip()).partition('=')
+        settings[expand(name) if expand else name] = value
+
+    ident = json.dumps([plot, [key(filename, filetype, version) for filename in inputs],
+                        sorted(settings.items()), version] + [str(item) for item in extra])
+
+    return hashlib.sha256(ident.encode()).hexdigest()
+
+
+class Recorder(io.TextIOBase):
+    ''' Pass writes through to stream while keeping a copy, to replay on a cache hit '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.text = io.StringIO()
+
+    def writable(self):
+        return True
+
+    def write(self, string):
+        self.text.write(string)
+        return self.stream.write(string)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return self.text.getvalue()
+
+
+def render_outputs(cache_dir, digest):
+    ''' Output names (with a {time} placeholder), cached files, and printed text of a render '''
+    try:
+        with open(os.path.join(cache_dir, f'{digest}.json')) as fin:
+            entry = json.load(fin)
+    except (OSError, ValueError):
+        return None
+
+    files = [os.path.join(cache_dir, name) for name in entry['files']]
+    return (entry['outputs'], files, entry.get('stdout', '')) \
+        if all(map(os.path.isfile, files)) else None
+
+
+def render_recall(cache_dir, digest, time):
+    ''' Copy a cached render's files to this run's output names, returning them (or None) '''
+    entry = render_outputs(cache_dir, digest)
+    if entry is None:
+        return None
+
+    # Whatever the plot function printed besides its outputs, e.g. fit tables
+    outputs, files, printed = entry
+    sys.stdout.write(printed)
+
+    filenames = list()
+    for output, source in zip(outputs, files):
+        filename = output.replace('{time}', time)
+        filenames.append(filename)
+
+        # The output may already hold this render, copied by an earlier run
+        if os.path.isfile(filename) and not filecmp.cmp(source, filename, shallow=False):
+            if not tools.query(f'Overwrite {filename}?', 'yes'):
+                continue
+            os.remove(filename)
+
+        # Copies, so editing an output in place cannot change the cached render
+        if not os.path.isfile(filename):
+            os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+            shutil.copyfile(source, filename)
+
+        cprint('OKGREEN', f'Output:  {os.path.realpath(filename)} (cached)')
+
+    # Touch for least-recently-used eviction
+    os.utime(os.path.join(cache_dir, f'{digest}.json'))
+    return filenames
+
+
+def render_store(cache_dir, digest, time, result, limit=None, printed=''):
+    ''' Keep the files a plot function returned and what it printed, unless it failed any '''
+    filenames = [result] if isinstance(result, str) else \
+        list(result) if isinstance(result, (list, tuple)) else list()
+
+    if not filenames or not all(isinstance(filename, str) and os.path.isfile(filename)
+                                for filename in filenames):
+        return
+
+    # Output lines are printed again, with `(cached)`, by render_recall
+    paths = [os.path.realpath(filename) for filename in filenames]
+    entry = {'outputs': list(), 'files': list(),
+             'stdout': ''.join(line for line in printed.splitlines(keepends=True)
+                               if not any(path in line for path in paths))}
+    manifest = os.path.join(cache_dir, f'{digest}.json')
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        for index, filename in enumerate(filenames):
+            name = f'{digest}-{index}{os.path.splitext(filename)[1]}'
+            shutil.copyfile(filename, os.path.join(cache_dir, name))
+            entry['outputs'].append(filename.replace(time, '{time}'))
+            entry['files'].append(name)
+
+        with open(f'{manifest}.{os.getpid()}.tmp', 'w') as fout:
+            json.dump(entry, fout)
+        os.replace(f'{manifest}.{os.getpid()}.tmp', manifest)
+    except Exception as e:
+        error(f'Could not write cached render `{manifest}` ({e})')
+        return
+
+    if limit is not None:
+        render_evict(cache_dir, limit)
+
+
+def render_evict(cache_dir, limit):
+    ''' Remove least-recently-used renders until their files fit in limit bytes '''
+    entries = scan(cache_dir, lambda name: name.endswith('.json'))
+
+    sizes = dict()
+    for entry, stat in scan(cache_dir, lambda name: not name.endswith('.json')):
+        digest = entry.name.split('-')[0]
+        sizes[digest] = sizes.get(digest, 0) + stat.st_size
+
+    total = sum(sizes.values())
+    for entry, _ in entries:
+        if total <= limit:
+            break
+
+        digest = entry.name[:-len('.json')]
+        remove(entry.path)
+        for name in os.listdir(cache_dir):
+            if name.startswith(f'{digest}-'):
+                remove(os.path.join(cache_dir, name))
+
+        total -= sizes.get(digest, 0)
@@ -0,0 +1,86 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import numpy as np
+
+from src import text
+
+
+def weights(bits):
+    ''' Binary weight of each of bits columns, MSB first '''
+    return 2 ** np.arange(bits - 1, -1, -1, dtype=np.int64)
+
+
+def pack(rows):
+    ''' Right-align bit rows of any length into a zero-padded (rows, bits) matrix '''
+    lengths = np.array([len(row) for row in rows], dtype=int)
+    width = lengths.max(initial=0)
+    matrix = np.zeros((len(rows), width), dtype=np.int64)
+
+    if lengths.sum():
+        row = np.repeat(np.arange(len(rows)), lengths)
+        offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matrix[row, width - lengths[row] + offset] = np.concatenate(rows)
+
+    return matrix
+
+
+def codes(matrix, bit_weights=None):
+    ''' Codes of a (conversions, bits) matrix, MSB first unless bit_weights says otherwise '''
+    matrix = np.asarray(matrix)
+    if bit_weights is None:
+        bit_weights = weights(matrix.shape[1])
+
+    return matrix @ bit_weights
+
+
+def dnl(code):
+    ''' Step from each code to the next (NaN after the last) '''
+    return np.append(np.diff(np.asarray(code, dtype=float)), np.nan)
+
+
+def code_voltage(code, vin, bits):
+    ''' Ideal input voltage of each code over the swept range of vin '''
+    codespace = np.linspace(np.nanmin(vin), np.nanmax(vin), num=2**bits)
+    return codespace[np.asarray(code).astype(int)]
+
+
+def inl_end(code, vin):
+    ''' INL in LSB against the line through the lowest- and highest-input conversions '''
+    code = np.asarray(code, dtype=float)
+    vin = np.asarray(vin, dtype=float)
+    lo, hi = np.nanargmin(vin), np.nanargmax(vin)
+
+    slope = (code[hi] - code[lo]) / (vin[hi] - vin[lo]) if vin[hi] > vin[lo] else 0
+    return code - (code[lo] + slope * (vin - vin[lo]))
+
+
+def inl_fit(code, vin):
+    ''' INL in LSB against the least-squares line through every conversion '''
+    code = np.asarray(code, dtype=float)
+    vin = np.asarray(vin, dtype=float)
+    finite = np.isfinite(code) & np.isfinite(vin)
+
+    if finite.sum() < 2:
+        return np.full(len(code), np.nan)
+
+    slope, offset = np.polyfit(vin[finite], code[finite], 1)
+    return code - (slope * vin + offset)
+
+
+def linearity(df, var, bits, dnl_on, inl_on, tail):
+    ''' Add DNL and INL columns to decoded df (with var and code columns) in place '''
+    if dnl_on:
+        df['dnl'] = dnl(df['code'])
+        df['abs_dnl'] = np.abs(df['dnl'])
+        if tail:
+            print(df.sort_values('abs_dnl', ascending=False)[[var, 'dnl']][0:tail])
+
+    if inl_on and bits:
+        df['inl'] = code_voltage(df['code'], df[var], bits)
+        df['inl_end'] = inl_end(df['code'], df[var])
+        df['inl_fit'] = inl_fit(df['code'], df[var])
+    elif inl_on:
+        text.error('Bitwidth not specified; cannot compute INL')
+
+    return df
@@ -0,0 +1,92 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import numpy as np
+
+# Parameter order of gauss()
+PARAMS = ['H', 'A', 'mu', 'sigma']
+
+
+def gauss(x, H, A, mu, sigma):
+    ''' Gaussian of height A and width sigma centered on mu, over a baseline H '''
+    return H + A * np.exp(-((x - mu) ** 2) / (2 * sigma**2))
+
+
+def jacobian(x, H, A, mu, sigma):
+    ''' Partial derivatives of gauss() with respect to (H, A, mu, sigma) '''
+    e = np.exp(-((x - mu) ** 2) / (2 * sigma**2))
+
+    return np.column_stack([np.ones_like(x), e,
+                            A * e * (x - mu) / sigma**2,
+                            A * e * (x - mu)**2 / sigma**3])
+
+
+def seed(x, y):
+    ''' Initial (H, A, mu, sigma) from the moments of y above its baseline '''
+    H = np.min(y)
+    weight = y - H
+    A = np.max(weight)
+
+    if not weight.sum() > 0:
+        return np.array([H, 0, np.mean(x), np.ptp(x) / 4 or 1])
+
+    mu = np.sum(weight * x) / weight.sum()
+    sigma = np.sqrt(np.sum(weight * (x - mu)**2) / weight.sum())
+
+    return np.array([H, A, mu, sigma if sigma > 0 else np.ptp(x) / 4 or 1])
+
+
+def gaussian(x, y, ci=95):
+    ''' Fit gauss() to (x, y), returning its parameters and a ci% interval on sigma '''
+    from scipy.optimize import curve_fit
+    from scipy.stats import t
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+
+    if len(x) <= len(PARAMS):
+        raise ValueError(f'Need more than {len(PARAMS)} points, got {len(x)}')
+
+    # Fit on x centered and scaled to order one, then map mu and sigma back
+    center, scale = np.mean(x), np.std(x) or 1
+    xs = (x - center) / scale
+    p0 = seed(xs, y)
+
+    parameters, covariance = curve_fit(
+        gauss, xs, y, p0=p0, jac=jacobian, maxfev=10000,
+        bounds=np.array([[-np.inf, 0, -np.inf, 0], [np.inf, np.inf, np.inf, np.inf]]))
+
+    stderr = np.sqrt(np.diag(covariance)) * np.array([1, 1, scale, scale])
+    parameters = parameters * np.array([1, 1, scale, scale]) + np.array([0, 0, center, 0])
+    half = t.ppf(0.5 + ci / 200, len(x) - len(PARAMS)) * stderr[3]
+
+    return dict(zip(PARAMS, parameters)) | {'sigma_lo': parameters[3] - half,
+                                            'sigma_hi': parameters[3] + half}
+
+
+def attempt(key, x, y, ci):
+    ''' gaussian() for one group, with NaNs and the reason if it fails '''
+    try:
+        return key, gaussian(x, y, ci), None
+    except Exception as e:
+        return key, dict.fromkeys(PARAMS + ['sigma_lo', 'sigma_hi'], np.nan), str(e)
+
+
+def fit_many(groups, ci=95, jobs=1):
+    ''' Fit every (key, x, y) group, in a process pool if jobs > 1, returning rows and errors '''
+    from concurrent.futures import ProcessPoolExecutor
+
+    groups = list(groups)
+    keys, xs, ys = zip(*groups) if groups else ((), (), ())
+
+    if jobs > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(attempt, keys, xs, ys, [ci] * len(groups),
+                                    chunksize=max(len(groups) // (jobs * 4), 1)))
+    else:
+        results = list(map(attempt, keys, xs, ys, [ci] * len(groups)))
+
+    return [(key, row) for key, row, _ in results], \
+        [(key, error) for key, _, error in results if error]
@@ -5,15 +5,29 @@ import pandas as pd
 import numpy as np
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-from src.tools import preprocess, check_filetype, si_convert
-from src.text import error
+from src.tools import relabel, check_filetype, si_convert, si_parse
 
 
-def ingest_wave(filename):
-    check_filetype(filename)
+def decode_labels(labels):
+    ''' Split Cadence wave labels into signal names and a parameter matrix '''
+    waves = [label.split()[0].strip('/') for label in labels]
+    params = list()
+
+    for label in labels:
+        if attr := re.findall(r".+ \((.*)\) .+", label):
+            params.append(dict(term.split('=') for term in attr[0].split(',')))
+        else:
+            params.append(dict())
+
+    params = pd.DataFrame(params, index=range(len(labels)), dtype=object)
+
+    return waves, params.apply(si_parse)
 
-    df_in = pd.read_csv(filename)
+
+def wave_frame(df_in, labels=None):
+    ''' Reshape an exported wave table into the long-format DataFrame '''
     x = df_in.iloc[:, 0]
 
     num = len(np.unique([item.split()[0] for item in df_in.columns]))
@@ -21,67 +35,189 @@ def ingest_wave(filename):
 
     assert series
 
-    df = pd.DataFrame(np.tile(np.array(x).astype(float), series).T,
-                      columns=['x'])
+    rows = len(df_in)
+    waves, params = labels if labels else \
+        decode_labels(df_in.columns[1:2 * num * series:2])
+
+    # (rows, num * series) -> (series * rows, num), series-major like the
+    # time axis tiled below
+    block = df_in.iloc[:, 1:2 * num * series:2].to_numpy(dtype=float)
+    block = block.reshape(rows, num, series).transpose(2, 0, 1).reshape(-1, num)
+
+    columns = {'x': np.tile(np.array(x).astype(float), series)}
 
     for i in range(num):
-        df_fill = pd.DataFrame()
+        if waves[i * series] not in columns:
+            columns[waves[i * series]] = block[:, i]
 
-        for label, content in df_in.iloc[:, (2 * i * series + 1):(2 * i * series + 1 + (2 * series)):2].items():
-            wave = label.split()[0].strip('/')
-            param = list()
+        fill = params.iloc[i * series:(i + 1) * series].dropna(axis=1, how='all')
+        for term in fill:
+            if term not in columns:
+                columns[term] = np.repeat(fill[term].to_numpy(dtype=float), rows)
 
-            if attr := re.findall(r".+ \((.*)\) .+", label):
-                param = attr[0].split(",")
+    df = pd.DataFrame(columns)
+    df.attrs['params'] = list(params.columns.intersection(df.columns))
+
+    return df
 
-            d_fill = pd.DataFrame(np.array([content.astype(float)]).T,
-                                  columns=[wave])
-            for term in param:
-                d_fill[term.split('=')[0]] = np.repeat(
-                    float(term.split('=')[1]), len(d_fill[wave]))
 
-            df_fill = pd.concat([df_fill, d_fill], axis=0, ignore_index=True)
+def stream_wave(reader):
+    ''' Yield wave frames chunk by chunk, each series-major over its own rows only '''
+    labels = None
 
-        df = pd.concat([df, df_fill], axis=1)
+    for chunk in reader:
+        if not labels:
+            num = len(np.unique([item.split()[0] for item in chunk.columns]))
+            series = len(chunk.columns) // 2 // num
+            labels = decode_labels(chunk.columns[1:2 * num * series:2])
 
-    return df.loc[:, ~df.columns.duplicated()].copy()
+        yield wave_frame(chunk, labels)
 
 
-def ingest_summary(filename):
+def ingest_wave(filename, chunksize=None):
     check_filetype(filename)
 
-    df_in = pd.read_csv(filename)
+    if chunksize:
+        return stream_wave(pd.read_csv(filename, chunksize=chunksize))
+
+    return wave_frame(pd.read_csv(filename))
+
+
+def summary_frame(df_in, names=None, outputs=None):
+    ''' Pivot complete summary points into one row per point '''
     df_in = df_in.replace('eval err', 'NaN', regex=False)
     df_in = df_in.replace('0b', '', regex=False)
-    param = df_in.loc[df_in["Point"].str.contains("Parameters"), "Point"]
+    param = df_in.loc[df_in["Point"].str.contains("Parameters", na=False), "Point"]
+
+    if names is None:
+        names = re.findall(r"([0-9a-z\.-]+)=[0-9a-z\.-]+", param.iloc[0])
+    if outputs is None:
+        outputs = df_in.loc[df_in["Point"] == "1", "Output"]
+
+    values = param.str.extractall(r"[0-9a-zA-Z\.-]+=([0-9a-zA-Z\.-]*)")[0]
+    df = si_convert(values.unstack().reindex(param.index).reset_index(drop=True),
+                    names)
+
+    # Pivot every output at once; the nth row of an output belongs to the
+    # nth point
+    data = df_in.loc[df_in["Output"].isin(outputs), ["Output", "Nominal"]]
+    data = data.assign(n=data.groupby("Output").cumcount())
+    nominal = data.pivot(index="n", columns="Output", values="Nominal")
+    nominal = nominal[list(outputs)].astype(float).reset_index(drop=True)
+    nominal.columns.name = None
+
+    df = pd.concat([df, nominal], axis=1)
+    df.attrs['params'] = list(names)
+
+    return df
+
+
+def stream_summary(reader):
+    ''' Yield summary frames, holding back the trailing (incomplete) point '''
+    names = outputs = None
+    carry = None
+
+    for chunk in reader:
+        # The carried point's all-NA columns must not decide the chunk's dtypes
+        if carry is not None and len(carry):
+            chunk = pd.concat([carry.dropna(axis=1, how='all'), chunk],
+                              ignore_index=True)[chunk.columns]
+
+        start = np.flatnonzero(chunk["Point"].str.contains("Parameters", na=False))
+        if len(start) < 2:
+            carry = chunk
+            continue
+
+        complete, carry = chunk.iloc[:start[-1]], chunk.iloc[start[-1]:]
+
+        if names is None:
+            param = complete.loc[complete["Point"].str.contains("Parameters", na=False), "Point"]
+            names = re.findall(r"([0-9a-z\.-]+)=[0-9a-z\.-]+", param.iloc[0])
+            outputs = complete.loc[complete["Point"] == "1", "Output"]
+
+        yield summary_frame(complete, names, outputs).dropna(axis=1, how='all')
+
+    if carry is not None and len(carry):
+        yield summary_frame(carry, names, outputs).dropna(axis=1, how='all')
+
+
+def ingest_summary(filename, chunksize=None):
+    check_filetype(filename)
+
+    if chunksize:
+        return stream_summary(pd.read_csv(filename, dtype={'Point': str},
+                                          chunksize=chunksize))
+
+    df_in = pd.read_csv(filename, dtype={'Point': str})
+
+    return summary_frame(df_in).dropna(axis=1, how='all')
+
+
+def ingest_raw(filename, chunksize=None):
+    check_filetype(filename)
+
+    return pd.read_csv(filename, chunksize=chunksize)
+
+
+def stream_wave_mc(filename, chunksize):
+    with open(filename) as fin:
+        labels = relabel(fin.readline())
+        reader = pd.read_csv(fin, header=None, chunksize=chunksize)
+
+        yield from stream_wave(chunk.set_axis(labels, axis=1) for chunk in reader)
+
+
+def ingest_wave_mc(filename, chunksize=None):
+    check_filetype(filename)
+
+    if chunksize:
+        return stream_wave_mc(filename, chunksize)
+
+    # Relabel the header in memory and parse the body straight from the source
+    with open(filename) as fin:
+        labels = relabel(fin.readline())
+        df_in = pd.read_csv(fin, header=None)
+
+    return wave_frame(df_in.set_axis(labels, axis=1))
+
+
+def ingest(filename, filetype='wave', chunksize=None):
+    ''' Ingest filename according to the ingest type '''
+    if 'sum' in filetype:
+        return ingest_summary(filename, chunksize)
+    elif 'raw' in filetype:
+        return ingest_raw(filename, chunksize)
+    elif 'mc' in filetype or 'monte' in filetype:
+        return ingest_wave_mc(filename, chunksize)
+    else:
+        return ingest_wave(filename, chunksize)
+
+
+def source(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
 
-    df = pd.DataFrame(
-        param.str.findall(r"[0-9a-zA-Z\.-]+=([0-9a-zA-Z\.-]*)").to_list())
 
-    df = si_convert(df, re.findall(r"([0-9a-z\.-]+)=[0-9a-z\.-]+", param[0]))
-    df = df.astype(float)
-    outputs = df_in.loc[df_in["Point"] == "1", "Output"]
+def stream_many(filenames, filetype, chunksize):
+    for filename in filenames:
+        for chunk in ingest(filename, filetype, chunksize):
+            df = chunk.assign(source=source(filename))
+            df.attrs['params'] = chunk.attrs.get('params', []) + ['source']
+            yield df
 
-    for output in outputs:
-        d_fill = pd.DataFrame(
-            np.array(
-                df_in[df_in["Output"] == output]["Nominal"].astype(float)).T,
-            columns=[output],
-        )
-        df = pd.concat([df, d_fill], axis=1)
 
-    return df.dropna(axis=1, how='all')
+def ingest_many(filenames, load=ingest, jobs=None):
+    ''' Ingest several files in a process pool, tagging rows with a source column '''
+    jobs = min(jobs or os.cpu_count(), len(filenames))
 
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        frames = list(pool.map(load, filenames))
 
-def ingest_wave_mc(filename):
-    temp_file = f'temp_{os.path.basename(filename)}'
-    preprocess(filename, temp_file)
+    frames = [df.assign(source=source(filename))
+              for filename, df in zip(filenames, frames)]
 
-    df = ingest_wave(temp_file)
+    params = [param for df in frames for param in df.attrs.get('params', [])]
 
-    try:
-        os.remove(temp_file)
-    except Exception as e:
-        error(f'Could not remove temporary file {temp_file} ({e})')
+    df = pd.concat(frames, ignore_index=True)
+    df.attrs['params'] = list(dict.fromkeys(params + ['source']))
 
     return df
@@ -0,0 +1,122 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import io
+import os
+import ast
+import importlib
+import importlib.util
+
+from src import text
+
+# Extra plot function directories, separated like PATH
+PLUGIN_PATH = 'ZC_PLOT_PATH'
+
+# Module-level literals read without importing the module
+METADATA = {
+    'COLUMNS': list(),      # Columns the input DataFrame must have
+    'KWARGS': list(),       # kwargs the function reads itself
+    'STREAM': False         # Accepts an iterator of DataFrame chunks
+}
+
+
+class PlotFunction:
+    ''' A plot function module that is only imported when it is used '''
+
+    def __init__(self, name, path, package=None):
+        self.name = name
+        self.path = path
+        self.package = package
+        self.module = None
+        self.metadata = None
+
+    def read_metadata(self):
+        if self.metadata is not None:
+            return self.metadata
+
+        self.metadata = dict(METADATA)
+        with open(self.path) as fin:
+            tree = ast.parse(fin.read(), self.path)
+
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                    and getattr(node.targets[0], 'id', None) in METADATA:
+                try:
+                    self.metadata[node.targets[0].id] = ast.literal_eval(node.value)
+                except ValueError:
+                    pass
+
+        return self.metadata
+
+    @property
+    def columns(self):
+        return self.read_metadata()['COLUMNS']
+
+    @property
+    def kwargs(self):
+        return self.read_metadata()['KWARGS']
+
+    @property
+    def stream(self):
+        return self.read_metadata()['STREAM']
+
+    def load(self):
+        if self.module:
+            return self.module
+
+        if self.package:
+            self.module = importlib.import_module(f'{self.package}.{self.name}')
+        else:
+            spec = importlib.util.spec_from_file_location(
+                f'zc_plot_plugin_{self.name}', self.path)
+            self.module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self.module)
+
+        return self.module
+
+    def usage(self):
+        return self.load().usage()
+
+    def plot(self, df, kwargs):
+        return self.load().plot(df, kwargs)
+
+
+def warm(functions):
+    ''' Import the plotting stack and functions, and load the font cache, ahead of plotting '''
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+    import matplotlib.pyplot  # noqa: F401
+    import pandas  # noqa: F401
+    import seaborn  # noqa: F401
+
+    for name, function in functions.items():
+        try:
+            function.load()
+        except Exception as e:
+            text.error(f'Could not import {name} ({e})')
+
+    fig = Figure()
+    fig.subplots().set_title('warm')
+    fig.savefig(io.BytesIO(), format='png')
+
+
+def discover(func_dir):
+    ''' Map names to plot functions in func_dir and then $ZC_PLOT_PATH '''
+    dirs = [func_dir] + [path for path in
+                         os.environ.get(PLUGIN_PATH, '').split(os.pathsep) if path]
+    functions = dict()
+
+    for index, directory in enumerate(dirs):
+        if not os.path.isdir(directory):
+            continue
+
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            name, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext == '.py' and not name.startswith('_') \
+                    and name not in functions:
+                functions[name] = PlotFunction(
+                    name, entry.path,
+                    os.path.basename(func_dir) if index == 0 else None)
+
+    return functions
@@ -0,0 +1,233 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import io
+import os
+import sys
+import json
+import stat
+import shutil
+import socket
+import struct
+import hashlib
+import traceback
+from time import process_time
+
+from src import text
+
+# CPU seconds the server had used before the current request (0 outside the server)
+CPU_START = 0.0
+
+
+def address(proj_dir):
+    ''' Socket path for this installation, in a directory only this user can enter '''
+    base = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+
+    return os.path.join(base, f'zc_plot-{user}',
+                        f'{hashlib.sha256(proj_dir.encode()).hexdigest()[:8]}.sock')
+
+
+def owned(path):
+    ''' Whether path belongs to this user (always true without uids) '''
+    return not hasattr(os, 'getuid') or os.stat(path).st_uid == os.getuid()
+
+
+def peer_owned(conn):
+    ''' Whether the process at the other end of conn runs as this user, where checkable '''
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+
+    credentials = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', credentials)[1] == os.getuid()
+
+
+class Channel:
+    ''' Newline-delimited JSON messages over a connected socket '''
+
+    def __init__(self, conn):
+        self.rfile = conn.makefile('r', encoding='utf-8')
+        self.wfile = conn.makefile('w', encoding='utf-8')
+
+    def send(self, **message):
+        self.wfile.write(json.dumps(message) + '\n')
+        self.wfile.flush()
+
+    def receive(self):
+        line = self.rfile.readline()
+        return json.loads(line) if line else None
+
+
+class Output(io.TextIOBase):
+    ''' Forward writes to the client's stdout or stderr '''
+
+    def __init__(self, channel, name):
+        self.channel = channel
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, string):
+        if string:
+            self.channel.send(**{self.name: string})
+        return len(string)
+
+
+class Input(io.TextIOBase):
+    ''' Read lines from the client's stdin on demand, so queries still work '''
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def readable(self):
+        return True
+
+    def readline(self, size=-1):
+        self.channel.send(read=True)
+        message = self.channel.receive()
+        return message.get('stdin', '') if message else ''
+
+
+def connect(address, argv):
+    ''' Run argv on the server at address and return its exit code, or None if none is running '''
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    # Never send argv, environment, or stdin to a server another user runs
+    try:
+        if not owned(address):
+            text.error(f'Ignoring server socket `{address}` owned by another user')
+            return None
+    except OSError:
+        return None
+
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(address)
+    except OSError:
+        conn.close()
+        return None
+
+    if not peer_owned(conn):
+        conn.close()
+        text.error(f'Ignoring server on `{address}` run by another user')
+        return None
+
+    channel = Channel(conn)
+    channel.send(argv=argv, cwd=os.getcwd(), env=dict(os.environ),
+                 columns=shutil.get_terminal_size()[0])
+
+    with conn:
+        while (message := channel.receive()) is not None:
+            if 'stdout' in message:
+                sys.stdout.write(message['stdout'])
+                sys.stdout.flush()
+            elif 'stderr' in message:
+                sys.stderr.write(message['stderr'])
+                sys.stderr.flush()
+            elif 'read' in message:
+                sys.stdout.flush()
+                channel.send(stdin=sys.stdin.readline())
+            elif 'exit' in message:
+                return message['exit']
+
+    text.error('Server closed the connection')
+    return 1
+
+
+def run(channel, request, script):
+    ''' Run one request's command line as if it were a fresh process, returning its exit code '''
+    global CPU_START
+    import runpy
+    from src import tools
+    from src import batch
+
+    CPU_START = process_time()
+    tools.ASSUME_DEFAULT = False
+
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'], COLUMNS=str(request['columns']))
+
+    sys.argv = [request['argv'][0], '--local'] + request['argv'][1:]
+    sys.stdout, sys.stderr = Output(channel, 'stdout'), Output(channel, 'stderr')
+    sys.stdin = Input(channel)
+
+    try:
+        runpy.run_path(script, run_name='__main__')
+        return 0
+    except SystemExit as e:
+        if isinstance(e.code, str):
+            print(e.code, file=sys.stderr)
+            return 1
+        return e.code or 0
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        sys.stdout, sys.stderr, sys.stdin = sys.__stdout__, sys.__stderr__, sys.__stdin__
+        batch.SHARED.clear()
+
+
+def serve(address, script, functions, memory):
+    ''' Answer client requests on the Unix socket at address until interrupted '''
+    from src import cache
+    from src import registry
+
+    if not hasattr(socket, 'AF_UNIX'):
+        text.error('Server mode needs Unix domain sockets', 107)
+
+    # Other users must not be able to replace the socket (sticky dirs like /tmp are safe)
+    directory = os.path.dirname(address) or '.'
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not owned(directory) and not os.stat(directory).st_mode & stat.S_ISVTX:
+        text.error(f'Socket directory `{directory}` belongs to another user', 107)
+
+    # A socket file nobody answers on is left over from a server that died
+    if os.path.exists(address):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(address)
+            text.error(f'A server is already listening on `{address}`', 107)
+        except OSError:
+            os.remove(address)
+        finally:
+            probe.close()
+
+    registry.warm(functions)
+    cache.MEMORY_LIMIT = memory
+
+    # The socket is created owner-only, so nobody else can connect in between
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        listener.bind(address)
+    finally:
+        os.umask(umask)
+    listener.listen()
+    text.cprint('OKBLUE', f'Listening on {address}')
+
+    # Requests run one at a time; each chdirs and swaps the standard streams
+    try:
+        while True:
+            conn, _ = listener.accept()
+
+            with conn:
+                if not peer_owned(conn):
+                    text.error('Refused a connection from another user')
+                    continue
+
+                channel = Channel(conn)
+                try:
+                    request = channel.receive()
+                    if request:
+                        channel.send(exit=run(channel, request, script))
+                except (OSError, ValueError) as e:
+                    text.error(f'Request failed ({e})')
+
+    except KeyboardInterrupt:
+        text.cprint('OKBLUE', '\nServer stopped')
+    finally:
+        listener.close()
+        os.remove(address)
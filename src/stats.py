@@ -0,0 +1,180 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import numpy as np
+
+
+def segments(key):
+    ''' Start and end (inclusive) of each run of equal values in sorted key '''
+    start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    end = np.r_[start[1:], len(key)] - 1
+
+    return start, end
+
+
+def minmax(x, y, group, buckets):
+    ''' Row indices of the first, last, lowest, and highest y per x bucket and group '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    order = np.lexsort((x, group))
+    x, y, group = x[order], y[order], np.asarray(group)[order]
+
+    # Bucket each sample within its own group's x range
+    start, end = segments(group)
+    count = end - start + 1
+    lo = np.repeat(np.fmin.reduceat(x, start), count)
+    width = np.repeat(np.fmax.reduceat(x, start), count) - lo
+    width[~(width > 0)] = 1
+
+    bucket = np.minimum(((x - lo) / width * buckets).astype(int), buckets - 1)
+    bucket[np.isnan(x)] = buckets - 1
+    key = np.repeat(np.arange(len(start)), count) * buckets + bucket
+
+    # key is already sorted, so sorting by (key, y) keeps the same runs
+    start, end = segments(key)
+    by_y = np.lexsort((y, key))
+    keep = np.unique(np.concatenate([start, end, by_y[start], by_y[end]]))
+
+    return np.sort(order[keep])
+
+
+def aggregate(df, x, y, by, ci):
+    ''' Mean of y per x and group with a Student-t confidence interval '''
+    from scipy.stats import t
+
+    grouped = df.groupby(by + [x], sort=False, observed=True, dropna=False)[y]
+    df = grouped.agg(['mean', 'std', 'count']).reset_index()
+
+    half = t.ppf(0.5 + ci / 200, df['count'] - 1) * df['std'] / np.sqrt(df['count'])
+    half = half.fillna(0)
+
+    return df.assign(lo=df['mean'] - half, hi=df['mean'] + half) \
+        .drop(columns=['std', 'count']).rename(columns={'mean': y})
+
+
+def edges(values, bins, log=False):
+    ''' Bin edges: bins itself if it is a sequence, else bins equal steps over values '''
+    if not np.isscalar(bins):
+        return np.asarray(bins, dtype=float)
+
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values) & ((values > 0) if log else True)]
+    lo, hi = (values.min(), values.max()) if len(values) else (1, 10)
+
+    if lo == hi:
+        lo, hi = (lo / 2, hi * 2) if log else (lo - 0.5, hi + 0.5)
+
+    return np.geomspace(lo, hi, int(bins) + 1) if log else np.linspace(lo, hi, int(bins) + 1)
+
+
+def binned(x, y, values, xedges, yedges, stat='mean'):
+    ''' Statistic of values in each (y, x) bin, NaN where a bin is empty '''
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    nx, ny = len(xedges) - 1, len(yedges) - 1
+
+    # Bins are closed on the left, except the last which includes its right edge
+    i = np.searchsorted(xedges, x, side='right') - 1
+    j = np.searchsorted(yedges, y, side='right') - 1
+    i[x == xedges[-1]] = nx - 1
+    j[y == yedges[-1]] = ny - 1
+
+    keep = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+    if values is not None:
+        values = np.asarray(values, dtype=float)
+        keep &= ~np.isnan(values)
+        values = values[keep]
+
+    flat = j[keep] * nx + i[keep]
+    count = np.bincount(flat, minlength=nx * ny)
+
+    if stat == 'count':
+        out = count.astype(float)
+    elif stat in ['mean', 'sum']:
+        out = np.bincount(flat, weights=values, minlength=nx * ny)
+        if stat == 'mean':
+            out = out / np.maximum(count, 1)
+    elif stat in ['min', 'max']:
+        order = np.argsort(flat, kind='stable')
+        flat = flat[order]
+        start, _ = segments(flat)
+        out = np.zeros(nx * ny)
+        if len(flat):
+            reduce = np.fmin if stat == 'min' else np.fmax
+            out[flat[start]] = reduce.reduceat(values[order], start)
+    else:
+        raise ValueError(f'Unknown statistic `{stat}`')
+
+    out[count == 0] = np.nan
+    return out.reshape(ny, nx)
+
+
+def scott(values):
+    ''' Scott's rule Gaussian kernel bandwidth (standard deviation) for 1D values '''
+    return np.std(values, ddof=1) * len(values) ** (-1 / 5)
+
+
+def kde(values, support=None, gridsize=1024, cut=3):
+    ''' Gaussian KDE of values on a regular grid, convolving a fine histogram by FFT '''
+    from scipy.signal import fftconvolve
+
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    bw = scott(values) if len(values) > 1 else 0
+
+    if not bw > 0:
+        return None, None
+
+    lo, hi = support if support else (values.min() - cut * bw, values.max() + cut * bw)
+    edges = np.linspace(lo, hi, gridsize + 1)
+    dx = edges[1] - edges[0]
+    hist, _ = np.histogram(values, edges)
+
+    # Odd-length kernel out to 4 bandwidths keeps the `same` output centered
+    offsets = np.arange(-min(gridsize, int(4 * bw / dx)), min(gridsize, int(4 * bw / dx)) + 1)
+    kernel = np.exp(-0.5 * (offsets * dx / bw)**2)
+
+    density = fftconvolve(hist, kernel / kernel.sum(), mode='same') / (len(values) * dx)
+    return (edges[:-1] + edges[1:]) / 2, np.maximum(density, 0)
+
+
+def kde2d(x, y, gridsize=256, cut=3):
+    ''' Gaussian KDE of (x, y) with Scott's rule covariance, by FFT on a fine 2D histogram '''
+    from scipy.signal import fftconvolve
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+
+    if len(x) < 3:
+        return None, None, None
+
+    cov = np.cov(x, y) * len(x)**(-1 / 3)
+    if not np.linalg.det(cov) > 0:
+        return None, None, None
+
+    bw = np.sqrt(np.diag(cov))
+    xedges = np.linspace(x.min() - cut * bw[0], x.max() + cut * bw[0], gridsize + 1)
+    yedges = np.linspace(y.min() - cut * bw[1], y.max() + cut * bw[1], gridsize + 1)
+    dx, dy = xedges[1] - xedges[0], yedges[1] - yedges[0]
+    hist, _, _ = np.histogram2d(y, x, [yedges, xedges])
+
+    # Correlated Gaussian kernel on the grid, out to 4 bandwidths per axis
+    nx, ny = min(gridsize, int(4 * bw[0] / dx)), min(gridsize, int(4 * bw[1] / dy))
+    kx, ky = np.meshgrid(np.arange(-nx, nx + 1) * dx, np.arange(-ny, ny + 1) * dy)
+    inv = np.linalg.inv(cov)
+    kernel = np.exp(-0.5 * (inv[0, 0] * kx**2 + 2 * inv[0, 1] * kx * ky + inv[1, 1] * ky**2))
+
+    density = fftconvolve(hist, kernel / kernel.sum(), mode='same') / (len(x) * dx * dy)
+    return (xedges[:-1] + xedges[1:]) / 2, (yedges[:-1] + yedges[1:]) / 2, \
+        np.maximum(density, 0)
+
+
+def quantile_levels(density, proportions):
+    ''' Density levels enclosing the given proportions of total mass '''
+    values = np.sort(np.ravel(density))[::-1]
+    mass = np.cumsum(values) / values.sum()
+
+    return np.take(values, np.searchsorted(mass, 1 - np.asarray(proportions)), mode='clip')
@@ -2,9 +2,9 @@
 # zenciso@nd.edu
 # Intelligent MicroSystems Lab
 
-import os
 import sys
 import re
+import shutil
 
 banner = ''' _________   ____  _       _
 |__  / ___| |  _ \\| | ___ | |_
@@ -13,7 +13,7 @@ banner = ''' _________   ____  _       _
 /____\\____| |_|   |_|\\___/ \\__|'''
 
 
-def cprint(color, string, end='\n', file=sys.stdout):
+def cprint(color, string, end='\n', file=None):
     bcolors = {
         'HEADER': '\033[95m',
         'OKBLUE': '\033[94m',
@@ -43,8 +43,9 @@ def error(message, exitcode=None):
         sys.exit(exitcode)
 
 
-def bar(header=None, char='#', length=os.get_terminal_size()[0]):
+def bar(header=None, char='#', length=None):
     ''' Return a bar with header centered in it '''
+    length = length if length else shutil.get_terminal_size()[0]
     output = '\n'
 
     if header:
@@ -69,27 +70,37 @@ def interactive_print(df, kwargs):
     print_kwargs(kwargs)
 
 
-def usage(exitcode, func_dir):
+def usage(exitcode, functions):
     ''' Print usage to stdout '''
     print(banner)
 
     print(f'''
-{sys.argv[0]} [options] PLOT INPUT [kwargs]
+{sys.argv[0]} [options] PLOT INPUT [INPUT ...] [kwargs]
+{sys.argv[0]} [options] -b FILE [kwargs]
     -h  --help      [PLOT]  Display this message or usage for PLOT
     -k  --kwargs     FILE   Load additional external kwargs from FILE
     -x  --export     FILE   Exports the current kwargs to FILE
     -t  --type       TYPE   Input file type ('wave', 'summary', 'mc', or 'raw', default: 'wave')
     -l  --log        FILE   Logfile name (or 'none' to disable)
+    -b  --batch      FILE   Render every job in the manifest FILE
+    -s  --stream     ROWS   Stream INPUT in chunks of ROWS rows
+    -j  --jobs       N      Worker processes for INPUTs and batch jobs (default: all cores)
+    -c  --compact           Store floats as float32 and sweep parameters as categoricals
+        --no-cache          Always parse INPUT and draw, bypassing the caches
+        --clear-cache       Empty the ingest and render caches
+        --server            Serve other runs with warm imports and recent INPUTs in memory
+        --local             Run here even if a server is running
     -i  --interact          View data ingest before setting kwargs
     -q  --quiet             Surpress verbose output
     -v  --version           Print version string
 
 List of available PLOTs:''')
 
-    for func in os.scandir(func_dir):
-        if func.is_file() and os.path.splitext(func)[-1] == '.py':
-            print(f'    {os.path.splitext(os.path.basename(func))[0]}')
+    for name in functions:
+        print(f'    {name}')
 
-    print('\nINPUT must be a valid CSV, e.g. `data/my_data.csv`.')
+    print('''
+INPUT must be a valid CSV, e.g. `data/my_data.csv`, or a glob.  Multiple INPUTs
+are ingested in parallel and tagged with a `source` column.''')
 
     sys.exit(exitcode)
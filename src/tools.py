@@ -8,7 +8,12 @@ from src import text
 import sys
 import re
 import os
-import numpy as np
+import itertools
+import csv
+import glob
+
+# Answer every query with its default, e.g. in batch mode
+ASSUME_DEFAULT = False
 
 SI = {
     'm': 'e-3',
@@ -25,27 +30,91 @@ SI = {
     'T': 'e12',
     'P': 'e15',
     'E': 'e18',
-    'nan': ''
+    '': ''
 }
 
+SI_PATTERN = r'^\s*([-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?)\s*([a-zA-Z]?)\s*$'
+
+
+def version(proj_dir):
+    ''' Short commit hash of proj_dir, read from VERSION or .git without git '''
+    try:
+        with open(os.path.join(proj_dir, 'VERSION')) as fin:
+            return fin.read().strip()
+    except OSError:
+        pass
+
+    git_dir = os.path.join(proj_dir, '.git')
+
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as fin:
+            head = fin.read().strip()
+
+        if head.startswith('ref: '):
+            ref = head[len('ref: '):]
+            if os.path.isfile(os.path.join(git_dir, ref)):
+                with open(os.path.join(git_dir, ref)) as fin:
+                    head = fin.read().strip()
+            else:
+                with open(os.path.join(git_dir, 'packed-refs')) as fin:
+                    head = next(line.split()[0] for line in fin
+                                if line.rstrip().endswith(f' {ref}'))
+
+        return head[:7]
+    except Exception as e:
+        return f'UNKNOWN ({e})'
+
 
 def check_filetype(filename):
     if os.path.splitext(filename)[-1] != '.csv':
         text.error('Input file must be .csv', 3)
 
 
-def si_convert(df, columns):
-    for col in df:
-        repl = np.unique(df[col].str.extract(r'([a-zA-Z])').astype(str))
+def si_parse(series):
+    ''' Convert strings like `1.5u`, `20n`, or `3k` to floats in one pass '''
+    parts = series.astype(str).str.extract(SI_PATTERN)
+    values = parts[0] + parts[1].map(SI)
+
+    # An exponent and an SI suffix together is ambiguous
+    values[parts[0].str.contains('[eE]', na=False) & (parts[1] != '')] = None
+
+    return values.fillna('nan').astype(float)
 
-        for item in repl:
-            df[col] = df[col].str.replace(item, SI[item], regex=False, case=True)
 
+def si_convert(df, columns):
+    df = df.apply(si_parse)
     df.columns = columns
 
     return df
 
 
+def compact(df):
+    ''' Store sweep parameters as categoricals and other floats as float32 '''
+    import numpy as np
+
+    params = df.attrs.get('params', [])
+
+    for col in df.columns:
+        if col in params:
+            df[col] = df[col].astype('category').cat.as_ordered()
+        elif df[col].dtype == np.float64:
+            # Only when every value survives the round trip, e.g. not a long,
+            # finely stepped time axis
+            low = df[col].to_numpy(dtype=np.float32)
+            if np.allclose(low, df[col], rtol=1e-6, atol=0, equal_nan=True) \
+                    and len(np.unique(low)) == df[col].nunique(dropna=False):
+                df[col] = low
+
+    return df
+
+
+def peek(chunks):
+    ''' Return the first chunk of an iterator and an equivalent iterator '''
+    first = next(chunks)
+
+    return first, itertools.chain([first], chunks)
+
+
 def query(prompt=None, default=None):
     '''Wait for user to input a y/n, with support for default'''
 
@@ -60,6 +129,9 @@ def query(prompt=None, default=None):
     else:
         raise ValueError(f'Invalid default answer: {default}')
 
+    if ASSUME_DEFAULT and default is not None:
+        return valid[default]
+
     while True:
         response = input('\033[93m' + prompt + sel + '\x1b[0m')
         if (default is not None) and len(response) == 0:
@@ -68,6 +140,19 @@ def query(prompt=None, default=None):
             return valid[response.lower()]
 
 
+def split_inputs(args):
+    ''' Split args into INPUTs (expanding globs) and the kwargs that follow '''
+    inputs = list()
+    args = list(args)
+
+    # Every argument up to the first kwarg is an input (or a glob)
+    while args and ('=' not in args[0] or os.path.isfile(args[0])):
+        pattern = args.pop(0)
+        inputs += sorted(glob.glob(pattern)) or [pattern]
+
+    return inputs, args
+
+
 def input_list():
     contents = list()
 
@@ -86,11 +171,9 @@ def input_list():
     return contents
 
 
-def preprocess(infile, outfile):
-    check_filetype(infile)
-
-    fin = open(infile)
-    columns = fin.readline().split(',')
+def relabel(header):
+    ''' Number each Monte Carlo run in a wave export header '''
+    columns = header.split(',')
 
     index = re.search(r"([0:9])", columns[0]).group(0)
     count = 1
@@ -105,12 +188,5 @@ def preprocess(infile, outfile):
 
         labels.append(f"{col.split()[0]}-{count // 2} {col.split()[1]}")
 
-    try:
-        fout = open(outfile, 'w')
-    except Exception as e:
-        text.error(f'Could not open {outfile} for writing ({e})', 255)
-
-    fout.write(f'{",".join(labels)}\n')
-
-    while line := fin.readline():
-        fout.write(line)
+    # Parse the new header the same way read_csv would
+    return next(csv.reader([','.join(labels)]))
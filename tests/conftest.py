@@ -0,0 +1,23 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def render(tmp_path):
+    ''' Render df with a plot function into tmp_path, returning the output filename '''
+    from src import registry
+
+    functions = registry.discover(os.path.join(ROOT, 'plot_functions'))
+
+    def render(plot, df, kwargs, name='out'):
+        return functions[plot].plot(df, [f'fn={tmp_path / name}', 'filetype=png'] + kwargs)
+
+    return render
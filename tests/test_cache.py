@@ -0,0 +1,81 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import os
+
+from src import cache
+
+
+def test_render_recall_replays_output(tmp_path, capsys):
+    figure = tmp_path / 'fig-T1.png'
+    figure.write_bytes(b'figure')
+    render_dir = str(tmp_path / 'render')
+
+    cache.render_store(render_dir, 'abc', 'T1', str(figure),
+                       printed=f'fit table\nOutput:  {os.path.realpath(figure)}\n')
+    capsys.readouterr()
+
+    filenames = cache.render_recall(render_dir, 'abc', 'T2')
+    printed = capsys.readouterr().out
+
+    assert filenames == [str(tmp_path / 'fig-T2.png')]
+    assert printed.startswith('fit table\n')
+    assert printed.count('Output:') == 1
+
+
+def test_render_recall_copies(tmp_path):
+    figure = tmp_path / 'fig-T1.png'
+    figure.write_bytes(b'figure')
+    render_dir = tmp_path / 'render'
+
+    cache.render_store(str(render_dir), 'abc', 'T1', str(figure))
+    filename, = cache.render_recall(str(render_dir), 'abc', 'T2')
+
+    # Editing either output in place leaves the cached render alone
+    figure.write_bytes(b'edited')
+    with open(filename, 'wb') as fout:
+        fout.write(b'edited')
+
+    assert (render_dir / 'abc-0.png').read_bytes() == b'figure'
+
+
+def removed_meanwhile(tmp_path, monkeypatch, stat_first):
+    ''' Cache directory listing with one entry already evicted by another process '''
+    for name in 'abc':
+        (tmp_path / f'{name}.pkl').write_bytes(b'x' * 10)
+
+    entries = list(os.scandir(tmp_path))
+    if stat_first:
+        for entry in entries:
+            entry.stat()
+
+    os.remove(tmp_path / 'a.pkl')
+    monkeypatch.setattr(cache.os, 'scandir', lambda path: iter(entries))
+
+
+def test_evict_removed_before_stat(tmp_path, monkeypatch):
+    removed_meanwhile(tmp_path, monkeypatch, stat_first=False)
+    cache.evict(str(tmp_path), 0)
+    monkeypatch.undo()
+
+    assert not os.listdir(tmp_path)
+
+
+def test_evict_removed_before_remove(tmp_path, monkeypatch):
+    removed_meanwhile(tmp_path, monkeypatch, stat_first=True)
+    cache.evict(str(tmp_path), 0)
+    monkeypatch.undo()
+
+    assert not os.listdir(tmp_path)
+
+
+def test_render_key_normalizes_kwargs():
+    from plot_functions import replot
+
+    keys = {cache.render_key('replot', [], 'wave', kwargs, 'v', expand=replot.key_expander)
+            for kwargs in [['y=out', 'hue=vdd'], ['hue=vdd', 'y=out'], ['h=vdd', 'y = out'],
+                           ['hue=temp', 'y=out', 'h=vdd']]}
+
+    assert len(keys) == 1
+    assert cache.render_key('replot', [], 'wave', ['y=out', 'hue=temp'], 'v',
+                            expand=replot.key_expander) not in keys
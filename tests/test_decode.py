@@ -0,0 +1,68 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from src import decode
+
+# Peak signs of each SAR conversion, MSB first; conversions may resolve fewer bits
+SIGNS = ['+-+', '+', '-++', '', '++++', '-+-+']
+
+
+def loop_sar(signs):
+    ''' The per-bit loop sar_adc used before decode '''
+    codes = list()
+    for peaks in signs:
+        code = 0
+        for i, sign in enumerate(peaks):
+            if sign == '+':
+                code = code + (2**(len(peaks) - 1 - i))
+        codes.append(code)
+
+    return codes
+
+
+def test_pack_right_aligns():
+    matrix = decode.pack([np.array([1, 0, 1]), np.array([1]), np.array([], dtype=int),
+                          np.array([0, 1])])
+
+    assert matrix.tolist() == [[1, 0, 1], [0, 0, 1], [0, 0, 0], [0, 0, 1]]
+
+
+def test_sar_codes_match_loop():
+    rows = [np.array([sign == '+' for sign in peaks], dtype=int) for peaks in SIGNS]
+    code = decode.codes(decode.pack(rows))
+
+    assert code.tolist() == loop_sar(SIGNS) == [5, 1, 3, 0, 15, 5]
+
+
+def test_adc_codes_match_loop():
+    df = pd.DataFrame({'vin': [0, 1, 2, 3], 'D0': [1, 0, 1, 1], 'D2': [0, 1, 1, 0],
+                       'D1': [1, 1, 0, 0]})
+
+    # The per-bit loop adc used before decode
+    code = np.zeros(len(df))
+    for col in df.columns[1:]:
+        code = code + df[col] * 2 ** int(re.match(r'.*([0-9]+).*', col)[1])
+
+    columns = list(df.columns[1:])
+    weights = np.array([2 ** int(col[1:]) for col in columns], dtype=float)
+
+    assert decode.codes(df[columns].to_numpy(dtype=float), weights).tolist() \
+        == code.tolist() == [3, 6, 5, 1]
+
+
+def test_inl():
+    code = np.array([0, 1, 3, 3])
+    vin = np.array([0.0, 1.0, 2.0, 3.0])
+
+    # The codespace lookup sar_adc and adc used before decode
+    codespace = np.linspace(vin.min(), vin.max(), num=2**2)
+    assert decode.code_voltage(code, vin, 2).tolist() == [codespace[int(i)] for i in code]
+
+    np.testing.assert_array_equal(decode.dnl(code), [1, 2, 0, np.nan])
+    np.testing.assert_allclose(decode.inl_end(code, vin), [0, 0, 1, 0], atol=1e-12)
+    np.testing.assert_allclose(decode.inl_fit(code, vin), [-0.1, -0.2, 0.7, -0.4], atol=1e-12)
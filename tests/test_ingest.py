@@ -0,0 +1,29 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import pandas as pd
+
+from src import ingest
+
+
+def summary(tmp_path, points=7):
+    ''' Summary export whose `pm` output never evaluated '''
+    lines = ['Point,Test,Output,Nominal,Spec,Weight,Pass/Fail']
+    for point in range(1, points + 1):
+        lines += [f'"Parameters: vdd={point / 10}, cap={point}p",,,,,,',
+                  f'{point},lib:cell:1,gain,{point * 0.5},> 0,1,pass',
+                  f'{point},lib:cell:1,bw,{point * 1e6},,,',
+                  f'{point},lib:cell:1,pm,eval err,,,']
+
+    filename = tmp_path / 'summary.csv'
+    filename.write_text('\n'.join(lines) + '\n')
+    return str(filename)
+
+
+def test_stream_summary_matches_eager(tmp_path):
+    filename = summary(tmp_path)
+    eager = ingest.ingest(filename, 'summary')
+
+    for chunksize in [1, 3, 4, 100]:
+        streamed = pd.concat(ingest.ingest(filename, 'summary', chunksize), ignore_index=True)
+        pd.testing.assert_frame_equal(streamed, eager)
@@ -0,0 +1,29 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def sweeps(vin, corner):
+    ''' Comparator outputs over a shared time axis, one run per input voltage '''
+    time = np.linspace(0, 1e-6, 50)
+    rng = np.random.default_rng(0)
+    out = [(rng.random(len(time)) < 1 / (1 + np.exp(-v / 1e-3))).astype(float) for v in vin]
+
+    return pd.DataFrame({'x': np.tile(time, len(vin)), 'out': np.concatenate(out),
+                         'vin': np.repeat(vin, len(time)), 'corner': corner})
+
+
+def test_short_hue_group(render, capsys):
+    df = pd.concat([sweeps(np.linspace(-5e-3, 5e-3, 21), 'tt'),
+                    sweeps(np.array([0, 1e-3]), 'ff')], ignore_index=True)
+
+    filename = render('input_ref_noise', df, ['y=out', 'var=vin', 'hue=corner'])
+    captured = capsys.readouterr()
+
+    assert os.path.getsize(filename)
+    assert 'corner = ff' in captured.err
+    assert 'tt' in captured.out and 'ff' in captured.out
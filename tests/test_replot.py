@@ -0,0 +1,49 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.normal(size=rows)
+
+    return pd.DataFrame({'a': a, 'b': a + rng.normal(size=rows), 'c': rng.normal(size=rows),
+                         'g': rng.integers(0, 3, rows)})
+
+
+def test_binned_heatmap(render):
+    filename = render('replot', frame(5000), ['x=a', 'y=b', 'hue=c', 'pt=heat',
+                                              'xbins=20', 'ybins=10'])
+    assert os.path.getsize(filename)
+
+
+def test_binned_heatmap_count(render):
+    filename = render('replot', frame(5000), ['x=a', 'y=b', 'pt=heat', 'stat=count',
+                                              'xbins=[-4,-1,0,1,4]', 'ybins=8'])
+    assert os.path.getsize(filename)
+
+
+def test_fast_kde_filled(render):
+    df = frame(2000)
+    filename = render('replot', df, ['x=a', 'y=b', 'pt=kde', 'fill=t', 'fast=t'])
+    assert os.path.getsize(filename)
+
+    filename = render('replot', df, ['x=a', 'y=b', 'pt=kde', 'fill=t', 'fast=t', 'hue=g'],
+                      name='hue')
+    assert os.path.getsize(filename)
+
+
+def test_reduce_maxrows():
+    from plot_functions import replot
+
+    df = frame(1000)
+    chunks = [df.iloc[start:start + 64] for start in range(0, len(df), 64)]
+    reduced = replot.reduce(chunks, ['x=a', 'y=b', 'maxrows=100'])
+
+    assert list(reduced.columns) == ['a', 'b']
+    assert len(reduced) <= 100
+    assert (reduced['a'].values == df['a'].values[::16]).all()
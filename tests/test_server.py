@@ -0,0 +1,50 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import os
+import sys
+import time
+import signal
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, 'SIGINT') or sys.platform == 'win32',
+                                reason='Server mode needs Unix domain sockets')
+
+
+@pytest.fixture
+def server(tmp_path):
+    ''' Environment whose zc_plot.py runs are answered by a fresh server '''
+    env = dict(os.environ, ZC_PLOT_SOCKET=str(tmp_path / 'server.sock'))
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'zc_plot.py'), '--server'],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 60
+    while not os.path.exists(env['ZC_PLOT_SOCKET']) and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    yield env
+
+    proc.send_signal(signal.SIGINT)
+    proc.wait(timeout=10)
+
+
+def run(env, *args):
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'zc_plot.py'), '-l', 'none', *args],
+                          env=env, input='\n\n', text=True, capture_output=True, timeout=60)
+
+
+def test_requests_do_not_share_mutations(server, tmp_path):
+    wave = tmp_path / 'w.csv'
+    wave.write_text('"/out (vdd=1.0) X","/out (vdd=1.0) Y","/out (vdd=1.1) X","/out (vdd=1.1) Y"\n'
+                    '0,0.1,0,0.2\n1,0.3,1,0.4\n2,0.5,2,0.6\n')
+
+    # The first request renames x in place; the second must still see x
+    run(server, 'csv_dump', str(wave), 'x=time', f'fn={tmp_path / "renamed"}')
+    result = run(server, 'csv_dump', str(wave), f'fn={tmp_path / "plain"}')
+
+    assert result.returncode == 0, result.stderr
+    assert (tmp_path / 'plain.csv').read_text().startswith('x,')
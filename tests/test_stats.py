@@ -0,0 +1,28 @@
+# Zephan M. Enciso
+# Intelligent MicroSystems Lab
+
+import numpy as np
+
+from src import stats
+
+X = np.arange(10)
+Y = np.array([3, 9, 1, 5, 4, 2, 8, 0, 6, 7])
+
+
+def test_minmax_keeps_extremes_per_bucket():
+    # Buckets hold x 0-4 and 5-9: first, max, min, last of each
+    index = stats.minmax(X, Y, np.zeros(10), 2)
+
+    assert index.tolist() == [0, 1, 2, 4, 5, 6, 7, 9]
+
+
+def test_minmax_buckets_each_group():
+    # Two interleaved groups, the second with y reversed
+    x = np.repeat(X, 2)
+    y = np.column_stack([Y, Y[::-1]]).ravel()
+    group = np.tile([0, 1], 10)
+
+    index = stats.minmax(x, y, group, 2)
+
+    assert index.tolist() == sorted([2 * k for k in [0, 1, 2, 4, 5, 6, 7, 9]]
+                                    + [2 * k + 1 for k in [0, 2, 3, 4, 5, 7, 8, 9]])
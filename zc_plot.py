@@ -4,15 +4,19 @@
 # zenciso@nd.edu
 # Intelligent MicroSystems Lab
 
+from time import process_time, perf_counter
 import sys
 import os
 import re
-import subprocess
-import pandas as pd
-from src import ingest
+import functools
+import contextlib
 from src import tools
 from src import logging
 from src import text
+from src import cache
+from src import registry
+from src import batch
+from src import server
 from datetime import datetime
 
 # Globals
@@ -21,50 +25,73 @@ CWD = os.getcwd()
 PROJ_DIR = os.path.dirname(os.path.realpath(__file__))
 FUNC_DIR = os.path.join(PROJ_DIR, 'plot_functions')
 LOG_DIR = os.path.join(PROJ_DIR, 'logs')
+CACHE_DIR = os.path.join(PROJ_DIR, 'cache', 'ingest')
+CACHE_SIZE = int(os.environ.get('ZC_PLOT_CACHE_SIZE', 1024)) * 2**20
+RENDER_DIR = os.path.join(PROJ_DIR, 'cache', 'render')
+RENDER_SIZE = int(os.environ.get('ZC_PLOT_RENDER_CACHE_SIZE', 1024)) * 2**20
+SERVER_MEMORY = int(os.environ.get('ZC_PLOT_SERVER_MEMORY', 2048)) * 2**20
 
-try:
-    VERSION = subprocess.check_output(['git', 'rev-parse', '--short',
-                                       'HEAD']).decode('ascii').strip()
-except Exception as e:
-    VERSION = f'UNKNOWN ({e})'
+# One server socket per user and installation
+SOCKET = os.environ.get('ZC_PLOT_SOCKET', server.address(PROJ_DIR))
+
+VERSION = tools.version(PROJ_DIR)
+FUNCTIONS = registry.discover(FUNC_DIR)
+
+# CPU seconds for interpreter start, imports, and option parsing
+STARTUP_BUDGET = 0.1
 
 PLOT = None
-INPUT = None
+INPUT = list()
+BATCH = None
+MANIFEST = list()
 KWARGS = None
 EXPORT = None
 LOG = None
 VERBOSE = True
 INTERACT = False
 FILETYPE = 'wave'
+STREAM = None
+CACHE = True
+RENDER = True
+JOBS = None
+COMPACT = False
+SERVE = False
 
 
 # Functions
 
-def log(kwargs, df):
-    ''' Write logfile '''
-    time = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-
+def log_open(time):
+    ''' Open the logfile for appending, or return None if logging is disabled '''
     if LOG == 'none':
-        return time
+        return None
     elif LOG:
         filename = LOG
     else:
         filename = os.path.join(LOG_DIR, f'{time}.log')
 
     try:
-        fout = open(filename, 'a')
+        return open(filename, 'a')
     except Exception as e:
         text.error(f'Could not open logfile `{filename}` for writing ({e})')
-        return time
+        return None
+
 
+def log_header(fout, time, startup):
     fout.write(f'ZC Plot ver. {VERSION}\n')
     fout.write(f'Executed on {time.split("T")[0]} at {time.split("T")[1]}\n')
+    fout.write(f'Startup: {startup * 1e3:.0f} ms CPU'
+               + (' (over budget)\n' if startup > STARTUP_BUDGET else '\n'))
     fout.write('-' * 80 + '\n\n')
 
-    fout.write(f'Input file: {INPUT}\n')
-    fout.write(f'Plot function: {PLOT}\n')
+
+def log_arguments(fout, kwargs):
     fout.write(f'''Arguments:
     Data ingest type: {FILETYPE.upper()}
+    Stream chunk size: {STREAM}
+    Ingest cache: {CACHE}
+    Render cache: {RENDER}
+    Jobs: {JOBS if JOBS else 'all cores'}
+    Compact: {COMPACT}
     Verbose: {VERBOSE}
     Interactive: {INTERACT}
     Export file: {EXPORT}
@@ -74,15 +101,178 @@ def log(kwargs, df):
     for kwarg in kwargs:
         fout.write(' ' * 4 + kwarg + '\n')
 
+
+def log(kwargs, df, startup):
+    ''' Write logfile '''
+    time = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    fout = log_open(time)
+
+    if not fout:
+        return time
+
+    log_header(fout, time, startup)
+    fout.write(f'Input file: {", ".join(INPUT)}\n')
+    fout.write(f'Plot function: {PLOT} ({FUNCTIONS[PLOT].path})\n')
+    log_arguments(fout, kwargs)
+
     # Dump DataFrame to fout
     fout.write('\n')
-    print(df, file=fout)
+    if hasattr(df, 'columns'):
+        print(df, file=fout)
+    elif df is None:
+        print('<figures reused from the render cache>', file=fout)
+    else:
+        print(f'<streamed in chunks of {STREAM} rows>', file=fout)
 
     fout.close()
-    text.cprint('OKBLUE', f'Logfile: {os.path.realpath(filename)}')
+    text.cprint('OKBLUE', f'Logfile: {os.path.realpath(fout.name)}')
     return time
 
 
+def log_batch(kwargs, frames, startup, cached):
+    ''' Write the batch logfile up to the per-figure timings '''
+    time = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    fout = log_open(time)
+
+    if not fout:
+        return time, None
+
+    log_header(fout, time, startup)
+    fout.write(f'Manifest: {BATCH}\n')
+    log_arguments(fout, kwargs)
+
+    fout.write('\nJobs:\n')
+    for index, (plot, (inputs, filetype), job_kwargs) in enumerate(MANIFEST):
+        fout.write(f'    [{index}] {plot} ({filetype.upper()}) '
+                   f'{" ".join(inputs + tuple(job_kwargs))}'
+                   + (' (cached)\n' if cached[index] else '\n'))
+
+    # Dump each DataFrame to fout
+    for (inputs, filetype), df in frames.items():
+        fout.write(f'\nInput file ({filetype.upper()}): {", ".join(inputs)}\n')
+        print(df, file=fout)
+
+    fout.write('\nTimings:\n')
+    fout.flush()
+    return time, fout
+
+
+def load(inputs, filetype):
+    ''' Ingest inputs into one DataFrame (or an iterator of chunks if streaming) '''
+    from src import ingest
+
+    # The server remembers recent ingests in memory
+    digest = '|'.join([cache.key(filename, filetype, VERSION) for filename in inputs]
+                      + [str(COMPACT)]) if CACHE else None
+    if digest and (df := cache.recall(digest)) is not None:
+        return df
+
+    if STREAM and len(inputs) > 1:
+        df = ingest.stream_many(inputs, filetype, STREAM)
+    elif STREAM:
+        df = ingest.ingest(inputs[0], filetype, STREAM)
+    else:
+        if CACHE:
+            load_one = functools.partial(cache.ingest_cached, filetype=filetype,
+                                         version=VERSION, cache_dir=CACHE_DIR,
+                                         limit=CACHE_SIZE)
+        else:
+            load_one = functools.partial(ingest.ingest, filetype=filetype)
+
+        df = load_one(inputs[0]) if len(inputs) == 1 else \
+            ingest.ingest_many(inputs, load_one, JOBS)
+
+    # Downcast floats and store sweep parameters as categoricals
+    if COMPACT and STREAM:
+        df = map(tools.compact, df)
+    elif COMPACT:
+        size = df.memory_usage(deep=True).sum()
+        df = tools.compact(df)
+        saved = size - df.memory_usage(deep=True).sum()
+        text.cprint('OKBLUE', f'Compact: saved {saved / 2**20:.1f} MB ({saved / size:.0%})')
+
+    if digest:
+        cache.remember(digest, df)
+
+    return df
+
+
+def render_key(plot, inputs, filetype, kwargs):
+    ''' Render cache digest of a plot, or None if the render cache is disabled '''
+    if not RENDER:
+        return None
+
+    # Uncommitted edits to the tool or a plugin do not change VERSION
+    code = cache.stamp([os.path.join(PROJ_DIR, 'src'), FUNC_DIR,
+                        os.path.dirname(FUNCTIONS[plot].path)])
+
+    # kwargs a plot function does not read itself go on to replot, which expands aliases
+    replot = FUNCTIONS['replot'].load()
+    own = FUNCTIONS[plot].kwargs
+
+    def expand(name):
+        return name if name in own else replot.key_expander(name)
+
+    return cache.render_key(plot, inputs, filetype, kwargs, VERSION, COMPACT, code,
+                            expand=expand)
+
+
+def reuse(digest, kwargs, startup, df=None):
+    ''' Link the figures of an identical earlier run, returning whether there were any '''
+    if not digest or cache.render_outputs(RENDER_DIR, digest) is None:
+        return False
+
+    time = log(kwargs, df, startup)
+    return cache.render_recall(RENDER_DIR, digest, time) is not None
+
+
+def run_batch(kwargs, frames, startup, digests, cached):
+    ''' Render every manifest job against its shared DataFrame, reusing cached renders '''
+    time, fout = log_batch(kwargs, frames, startup, cached)
+    width = len(str(len(MANIFEST) - 1))
+    failures = 0
+    total = perf_counter()
+
+    jobs = [(index, len(MANIFEST), plot, key,
+             [f'time={time}-{index:0{width}d}', f'version={VERSION}'] + kwargs + job_kwargs)
+            for index, (plot, key, job_kwargs) in enumerate(MANIFEST)]
+    results = batch.render_all([job for job, hit in zip(jobs, cached) if not hit],
+                               frames, FUNCTIONS, JOBS)
+
+    for job, digest, hit in zip(jobs, digests, cached):
+        index, plot, job_time = job[0], job[2], job[4][0][len('time='):]
+
+        if hit:
+            start = perf_counter()
+            batch.header(job)
+            failed = cache.render_recall(RENDER_DIR, digest, job_time) is None
+            elapsed = perf_counter() - start
+        else:
+            elapsed, failed, _, _, result, printed = next(results)
+            if digest and not failed:
+                cache.render_store(RENDER_DIR, digest, job_time, result, printed=printed)
+
+        failures += failed
+
+        if fout:
+            fout.write(f'    [{index}] {plot}: {elapsed * 1e3:.0f} ms'
+                       + (' (cached)' if hit else '')
+                       + (' (failed)\n' if failed else '\n'))
+            fout.flush()
+
+    # Evict only once every job has been linked, so no pending hit is removed
+    if RENDER and os.path.isdir(RENDER_DIR):
+        cache.render_evict(RENDER_DIR, RENDER_SIZE)
+
+    if fout:
+        fout.write(f'Total: {(perf_counter() - total) * 1e3:.0f} ms with '
+                   f'{JOBS if JOBS else "all"} jobs, {failures} failed\n')
+        fout.close()
+        text.cprint('OKBLUE', f'Logfile: {os.path.realpath(fout.name)}')
+
+    return failures
+
+
 # Main execution
 
 if __name__ == '__main__':
@@ -90,15 +280,20 @@ if __name__ == '__main__':
     # TODO: Change this to argparse
     args = sys.argv[1:]
 
+    # Hand the command line to a running server, if there is one
+    if '--local' not in args and '--server' not in args:
+        exitcode = server.connect(SOCKET, sys.argv)
+        if exitcode is not None:
+            sys.exit(exitcode)
+
     while len(args) and args[0].startswith('-'):
         if args[0] == '-h' or args[0] == '--help':
             args.pop(0)
-            if args and args[0] in ' '.join(os.listdir(FUNC_DIR)):
-                exec(f'from {os.path.basename(FUNC_DIR)} import {args[0]}')
-                eval(f'{args[0]}.usage()')
+            if args and args[0] in FUNCTIONS:
+                FUNCTIONS[args[0]].usage()
                 sys.exit(0)
             else:
-                text.usage(0, FUNC_DIR)
+                text.usage(0, FUNCTIONS)
         elif args[0] == '-q' or args[0] == '--quiet':
             VERBOSE = False
         elif args[0] == '-v' or args[0] == '--version':
@@ -106,29 +301,71 @@ if __name__ == '__main__':
             exit(0)
         elif args[0] == '-t' or args[0] == '--type':
             FILETYPE = args.pop(1).lower()
+        elif args[0] == '-s' or args[0] == '--stream':
+            STREAM = int(args.pop(1))
+        elif args[0] == '-j' or args[0] == '--jobs':
+            JOBS = int(args.pop(1))
+        elif args[0] == '-c' or args[0] == '--compact':
+            COMPACT = True
+        elif args[0] == '--no-cache':
+            CACHE = False
+            RENDER = False
+        elif args[0] == '--clear-cache':
+            cache.clear(CACHE_DIR)
+            cache.clear(RENDER_DIR)
+            if len(args) == 1:
+                text.cprint('OKBLUE', f'Cleared {CACHE_DIR} and {RENDER_DIR}')
+                sys.exit(0)
         elif args[0] == '-i' or args[0] == '--interact':
             INTERACT = True
         elif args[0] == '-k' or args[0] == '--kwargs':
             KWARGS = args.pop(1)
         elif args[0] == '-x' or args[0] == '--export':
             EXPORT = args.pop(1)
+        elif args[0] == '-b' or args[0] == '--batch':
+            BATCH = args.pop(1)
         elif args[0] == '-l' or args[0] == '--log':
             LOG = args.pop(1)
+        elif args[0] == '--server':
+            SERVE = True
+        elif args[0] == '--local':
+            pass
         else:
             text.error(f'Not a valid option `{args[0]}`\n')
-            text.usage(1, FUNC_DIR)
+            text.usage(1, FUNCTIONS)
 
         args.pop(0)
 
+    # Server mode: keep imports and recent ingests warm between requests
+    if SERVE:
+        server.serve(SOCKET, os.path.realpath(__file__), FUNCTIONS, SERVER_MEMORY)
+        sys.exit(0)
+
     # Missing arguments
-    if len(args) < 2:
+    if BATCH:
+        if not os.path.isfile(BATCH):
+            text.error(f'Manifest `{BATCH}` is not a valid file', 105)
+
+        # Remaining arguments are kwargs shared by every job
+        MANIFEST = batch.read_manifest(BATCH, FILETYPE)
+        INPUT = [filename for inputs, _ in batch.inputs(MANIFEST) for filename in inputs]
+        kwargs = args
+
+        if STREAM or INTERACT:
+            text.cprint('WARNING', 'Streaming and interactive mode are ignored in batch mode')
+            STREAM, INTERACT = None, False
+
+    elif len(args) < 2:
         text.error('Not enough arguments\n')
-        text.usage(2, FUNC_DIR)
+        text.usage(2, FUNCTIONS)
 
     else:
         PLOT = args.pop(0)
-        INPUT = args.pop(0)
-        kwargs = args
+        INPUT, kwargs = tools.split_inputs(args)
+
+    if not INPUT:
+        text.error('No INPUT specified\n')
+        text.usage(2, FUNCTIONS)
 
     # Create default directories
     if not os.path.isdir(os.path.join(PROJ_DIR, 'plots')):
@@ -142,23 +379,20 @@ if __name__ == '__main__':
             os.mkdir(os.path.join(PROJ_DIR, 'logs'))
 
     # Check plot function, input file, external kwargs
-    if not os.path.isfile(os.path.join(FUNC_DIR, f'{PLOT}.py')):
-        text.error(f'{PLOT} is not a valid function', 101)
-    if not os.path.isfile(INPUT):
-        text.error(f'Input `{INPUT}` is not a valid file', 102)
+    for plot in [job[0] for job in MANIFEST] if BATCH else [PLOT]:
+        if plot not in FUNCTIONS:
+            text.error(f'{plot} is not a valid function', 101)
+    for filename in INPUT:
+        if not os.path.isfile(filename):
+            text.error(f'Input `{filename}` is not a valid file', 102)
     if KWARGS and not os.path.isfile(KWARGS):
         text.error(f'External kwargs `{KWARGS}` is not a valid file', 103)
 
-    # Ingest data
-    if 'sum' in FILETYPE:
-        df = ingest.ingest_summary(INPUT)
-    elif 'raw' in FILETYPE:
-        tools.check_filetype(INPUT)
-        df = pd.read_csv(INPUT)
-    elif 'mc' in FILETYPE or 'monte' in FILETYPE:
-        df = ingest.ingest_wave_mc(INPUT)
-    else:
-        df = ingest.ingest_wave(INPUT)
+    # Heavy imports start here; usage, help, and version must not need them
+    startup = process_time() - server.CPU_START
+
+    # Ingest data (cached unless streaming)
+    CACHE = CACHE and not STREAM
 
     # Concatenate kwargs with external kwargs
     if KWARGS:
@@ -167,8 +401,38 @@ if __name__ == '__main__':
             if line.strip() and not line.strip().startswith('#')
         ] + kwargs
 
-    # Interactive mode
-    if INTERACT:
+    # Batch mode: ingest each INPUT set once and share it between jobs
+    if BATCH:
+        if EXPORT:
+            logging.export_kwargs(kwargs, EXPORT, VERSION)
+
+        tools.ASSUME_DEFAULT = True
+
+        # Only INPUTs with a job to render are ingested
+        digests = [render_key(plot, list(inputs), filetype, kwargs + job_kwargs)
+                   for plot, (inputs, filetype), job_kwargs in MANIFEST]
+        cached = [bool(digest) and cache.render_outputs(RENDER_DIR, digest) is not None
+                  for digest in digests]
+        pending = [job for job, hit in zip(MANIFEST, cached) if not hit]
+
+        frames = {(inputs, filetype): load(list(inputs), filetype)
+                  for inputs, filetype in batch.inputs(pending)}
+
+        for plot, (inputs, filetype), _ in pending:
+            for column in FUNCTIONS[plot].columns:
+                if column not in frames[inputs, filetype].columns:
+                    text.error(f'{plot} requires column `{column}` in {", ".join(inputs)}', 104)
+
+        sys.exit(106 if run_batch(kwargs, frames, startup, digests, cached) else 0)
+
+    # Interactive mode needs the data before the kwargs are final
+    df = load(INPUT, FILETYPE) if INTERACT else None
+
+    if INTERACT and STREAM:
+        first, df = tools.peek(df)
+        text.interactive_print(first, kwargs)
+        kwargs += tools.input_list()
+    elif INTERACT:
         text.interactive_print(df, kwargs)
         kwargs += tools.input_list()
 
@@ -176,13 +440,34 @@ if __name__ == '__main__':
     if EXPORT:
         logging.export_kwargs(kwargs, EXPORT, VERSION)
 
-    # Import plot function
-    exec(f'from {os.path.basename(FUNC_DIR)} import {PLOT}')
+    # Reuse the figures of an identical earlier run, usually without ingesting
+    digest = render_key(PLOT, INPUT, FILETYPE, kwargs)
+    if reuse(digest, kwargs, startup, df):
+        sys.exit(0)
+
+    if df is None:
+        df = load(INPUT, FILETYPE)
+
+    # Plot functions without STREAM support get the whole DataFrame
+    if STREAM and not FUNCTIONS[PLOT].stream:
+        import pandas as pd
+        text.cprint('WARNING', f'{PLOT} does not support streaming, reading all chunks')
+        df = pd.concat(df, ignore_index=True)
+
+    # Check required columns
+    if hasattr(df, 'columns'):
+        for column in FUNCTIONS[PLOT].columns:
+            if column not in df.columns:
+                text.error(f'{PLOT} requires column `{column}`', 104)
 
     # Log and plot!
-    time = log(kwargs, df)
+    time = log(kwargs, df, startup)
     kwargs = [f'time={time}', f'version={VERSION}'] + kwargs
 
-    exec(f'from {os.path.basename(FUNC_DIR)} import {PLOT}')
-    eval(f'{PLOT}.plot(df, kwargs)')
+    # Record what the plot function prints, e.g. fit tables, to replay on a cache hit
+    with contextlib.redirect_stdout(cache.Recorder(sys.stdout)) as printed:
+        result = FUNCTIONS[PLOT].plot(df, kwargs)
+    if digest:
+        cache.render_store(RENDER_DIR, digest, time, result, RENDER_SIZE, printed.getvalue())
+
     sys.exit(0)